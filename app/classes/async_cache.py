@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator
+
+import cachetools
+
+
+class _TTLCache(cachetools.TTLCache):
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        # only called when the cache is full
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class AsyncCache:
+    """A TTL cache that loads missing keys itself.
+
+    Concurrent misses for the same key share a single load instead of
+    each running their own. With stale_ttl, a value that is older than
+    ttl (but not older than ttl + stale_ttl) is still returned right
+    away, while it gets reloaded in the background.
+
+    Deleting a key also stops a load that is already running for it
+    from storing its result, so edits are never undone by a slow load
+    that started before them."""
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (value, time it stops being fresh)
+        self._entries = _TTLCache(maxsize, ttl + stale_ttl)
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        # misses that waited for a load that was already running
+        self.coalesced = 0
+
+    @property
+    def evictions(self) -> int:
+        return self._entries.evictions
+
+    @property
+    def maxsize(self) -> int:
+        return self._entries.maxsize
+
+    def values(self) -> Iterator[Any]:
+        return (value for value, _ in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def __delitem__(self, key: Hashable) -> None:
+        self.pop(key)
+
+    def peek(self, key: Hashable) -> Any:
+        """The cached value for key, or None. Doesn't load anything or
+        count as a lookup."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+
+    async def get(
+        self, key: Hashable, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Returns the value for key, awaiting load() if it isn't
+        cached and nobody else is loading it already."""
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if time.monotonic() < fresh_until:
+                self.hits += 1
+                return value
+            self.stale_hits += 1
+            if key not in self._loading:
+                self._start(key, load)
+            return value
+
+        future = self._loading.get(key)
+        if future is None:
+            self.misses += 1
+            future = self._start(key, load)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def _start(
+        self, key: Hashable, load: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self._loading[key] = future
+        asyncio.create_task(self._load(key, load, future))
+        return future
+
+    async def _load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        future: asyncio.Future,
+    ) -> None:
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            self._finish(key, future)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._finish(key, future)
+            future.set_exception(e)
+            # background reloads have nobody waiting on them
+            future.exception()
+            return
+
+        if self._finish(key, future):
+            self[key] = value
+        future.set_result(value)
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> bool:
+        """Returns whether this load may still store its result."""
+        if self._loading.get(key) is future:
+            del self._loading[key]
+            return True
+        return False
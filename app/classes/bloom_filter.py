@@ -0,0 +1,55 @@
+import math
+
+_MASK = (1 << 64) - 1
+
+
+class BloomFilter:
+    """A set of ints that can't list or remove its items, and that may
+    claim to contain an item it doesn't (but never the other way
+    around), in exchange for using ~10 bits per item."""
+
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: int):
+        # two independent mixes of the item, combined as
+        # h1 + i * h2 to get as many hashes as needed
+        h = (item * 0x9E3779B97F4A7C15) & _MASK
+        h1 = h ^ (h >> 31)
+        h2 = (((item ^ (item >> 29)) * 0xBF58476D1CE4E5B9) & _MASK) | 1
+        size = self.size
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % size
+
+    def add(self, item: int) -> None:
+        bits = self.bits
+        for p in self._positions(item):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item: int) -> bool:
+        bits = self.bits
+        for p in self._positions(item):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    @property
+    def memory(self) -> int:
+        """Size of the bit array in bytes."""
+        return len(self.bits)
+
+    @property
+    def error_rate(self) -> float:
+        """The current chance that an item that was never added is
+        reported as present, based on how full the filter is."""
+        set_bits = bin(int.from_bytes(self.bits, "little")).count("1")
+        return (set_bits / self.size) ** self.hashes
@@ -7,7 +7,7 @@ import textwrap
 import traceback
 import typing
 from contextlib import asynccontextmanager, redirect_stdout
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import aiohttp
 import discord
@@ -17,9 +17,15 @@ from dotenv import load_dotenv
 
 import config
 from app import commands, i18n, utils
+from app.classes.cache_registry import caches
+from app.classes.coalescer import Coalescer
 from app.classes.context import MyContext
+from app.classes.counter_registry import counters
 from app.classes.ipc_connection import WebsocketConnection
 from app.classes.limited_list import LimitedList
+from app.classes.outbound import OutboundQueue
+from app.classes.point_counters import PointCounters
+from app.classes.write_behind import WriteBehind
 from app.database.database import Database
 from app.i18n.i18n import t_
 from app.menus import HelpMenu
@@ -43,10 +49,17 @@ class Bot(commands.AutoShardedBot):
 
         self._last_result = None
         self.stats = {}
-        self.locale_cache = {}
-        self.to_cleanup: Dict[int, LimitedList] = {}
+        self.locale_cache = caches.register("bot.locale_cache", {})
+        self.to_cleanup: Dict[int, LimitedList] = caches.register(
+            "bot.to_cleanup", {}
+        )
 
-        self.update_message_lock = set()
+        self.update_message_coalescer = counters.register(
+            "starboard.update_message", Coalescer()
+        )
+        self.point_counters = PointCounters()
+        # written out before the pool is closed
+        self.write_behinds: List[WriteBehind] = []
 
         self.cache: "Cache"
 
@@ -84,10 +97,15 @@ class Bot(commands.AutoShardedBot):
         self.log = logging.getLogger(f"Cluster#{self.cluster_name}")
         self.log.setLevel(logging.DEBUG)
 
+        self.outbound = counters.register(
+            "starboard.outbound", OutboundQueue(self.log)
+        )
+
         self.db: Database = Database(
             os.getenv("DB_NAME"),
             os.getenv("DB_USER"),
             os.getenv("DB_PASSWORD"),
+            os.getenv("DB_PGBOUNCER", "").lower() == "true",
         )
         self.pipe = kwargs.pop("pipe")
         self.websocket = WebsocketConnection(
@@ -96,6 +114,11 @@ class Bot(commands.AutoShardedBot):
 
         self.loop.run_until_complete(self.websocket.ensure_connection())
         self.loop.run_until_complete(self.db.init_database())
+        self.loop.create_task(
+            self.db.messages.seed_known(
+                kwargs["shard_ids"], kwargs["shard_count"]
+            )
+        )
 
         self.log.info(
             f'[Cluster#{self.cluster_name}] {kwargs["shard_ids"]}, '
@@ -125,9 +148,9 @@ class Bot(commands.AutoShardedBot):
         if ctx.guild is None:
             return
 
-        await self.db.guilds.create(ctx.guild.id)
-        await self.db.users.create(ctx.author.id, ctx.author.bot)
-        await self.db.members.create(ctx.author.id, ctx.guild.id)
+        await self.db.members.create(
+            ctx.author.id, ctx.guild.id, ctx.author.bot
+        )
 
     async def is_owner(self, user: discord.User):
         if user.id in config.OWNER_IDS:
@@ -193,6 +216,10 @@ class Bot(commands.AutoShardedBot):
         return content.strip("` \n")
 
     async def close(self, *args, **kwargs):
+        # some edits still write to the database
+        await self.outbound.close()
+        for buffer in self.write_behinds:
+            await buffer.close()
         await self.db.pool.close()
         if self._session and not self._session.closed:
             await self._session.close()
@@ -275,6 +302,16 @@ class Bot(commands.AutoShardedBot):
                     key = str(c.category or "No Category")
                     ret.setdefault(key, {})
                     ret[key][c.id] = c.name
+        elif cmd == "starboard_edited":
+            self.db.starboards.edited(data["starboard_id"], data["guild_id"])
+        elif cmd == "permissions_edited":
+            self.db.permgroups.edited(data["guild_id"])
+        elif cmd == "cache_stats":
+            ret = caches.stats()
+        elif cmd == "sql_stats":
+            ret = self.db.get_sql_stats()
+        elif cmd == "counter_stats":
+            ret = counters.stats()
         elif cmd == "donate_event":
             self.dispatch("donatebot_event", data["data"], data["auth"])
         elif cmd == "update_prem_roles":
@@ -0,0 +1,124 @@
+import itertools
+import sys
+from typing import Any, Dict, Iterable, List
+
+import cachetools
+
+# how many values to measure when estimating the memory of a cache
+_SAMPLE_SIZE = 50
+
+
+class _Counted:
+    """Counts hits, misses and evictions of a cachetools cache."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.hits += 1
+        return value
+
+    def __missing__(self, key):
+        self.misses += 1
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        self.misses += 1
+        return default
+
+    def pop(self, key, *args):
+        # Cache.pop() reads the value through __getitem__
+        hits = self.hits
+        try:
+            return super().pop(key, *args)
+        finally:
+            self.hits = hits
+
+    def popitem(self):
+        # only called when the cache is full
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class CountedTTLCache(_Counted, cachetools.TTLCache):
+    pass
+
+
+class CountedLRUCache(_Counted, cachetools.LRUCache):
+    pass
+
+
+def _sizeof(obj: Any, depth: int = 3) -> int:
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+    if isinstance(obj, dict):
+        items: Iterable[Any] = itertools.chain(obj.keys(), obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = obj
+    elif hasattr(obj, "__slots__"):
+        items = [getattr(obj, s, None) for s in obj.__slots__]
+    else:
+        return size
+    return size + sum(_sizeof(i, depth - 1) for i in items)
+
+
+class CacheRegistry:
+    """Every long lived cache of the process, by name, so that they can
+    all be inspected in one place."""
+
+    def __init__(self):
+        self.caches: Dict[str, Any] = {}
+
+    def register(self, name: str, cache: Any) -> Any:
+        self.caches[name] = cache
+        return cache
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.cache_stats(c) for name, c in self.caches.items()}
+
+    @staticmethod
+    def cache_stats(cache: Any) -> Dict[str, Any]:
+        stats = {
+            "size": len(cache),
+            "maxsize": getattr(cache, "maxsize", None),
+            "ttl": getattr(cache, "ttl", None),
+        }
+        for key in ("hits", "stale_hits", "misses", "coalesced", "evictions"):
+            if hasattr(cache, key):
+                stats[key] = getattr(cache, key)
+
+        # measure a few values and assume the rest are similar
+        values: List[Any] = list(
+            itertools.islice(cache.values(), _SAMPLE_SIZE)
+        )
+        memory = sys.getsizeof(cache)
+        if values:
+            sample = sum(_sizeof(v) for v in values)
+            memory += sample * len(cache) // len(values)
+        stats["memory"] = memory
+        return stats
+
+    @staticmethod
+    def merge(all_stats: List[Dict[str, Dict[str, Any]]]):
+        """Adds up the stats of several processes."""
+        result: Dict[str, Dict[str, Any]] = {}
+        for stats in all_stats:
+            for name, cache in stats.items():
+                merged = result.setdefault(name, {})
+                for key, value in cache.items():
+                    if key in ("maxsize", "ttl"):
+                        merged[key] = value
+                    elif value is not None:
+                        merged[key] = merged.get(key, 0) + value
+        return result
+
+
+caches = CacheRegistry()
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+
+class Coalescer:
+    """Runs at most one job per key at a time, without losing updates.
+
+    If a job is requested while one is already running for that key, a
+    single trailing run is queued. Any further requests made before the
+    trailing run starts are merged into it, so a burst of N requests
+    results in one run in progress plus exactly one run afterwards."""
+
+    def __init__(self):
+        self._running: Set[Hashable] = set()
+        self._queued: Dict[
+            Hashable,
+            Tuple[asyncio.Future, Callable[..., Awaitable[Any]], tuple],
+        ] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "running": len(self._running),
+            "queued": len(self._queued),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+    async def run(
+        self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any
+    ) -> Any:
+        """Runs func(*args) for key, or waits for a queued run to
+        finish if there already is one."""
+
+        queued = self._queued.get(key)
+        if queued is not None:
+            self.coalesced += 1
+            future = queued[0]
+            # use the newest arguments for the trailing run
+            self._queued[key] = (future, func, args)
+        else:
+            future = asyncio.get_event_loop().create_future()
+            self._queued[key] = (future, func, args)
+            if key not in self._running:
+                self._running.add(key)
+                asyncio.create_task(self._drive(key))
+
+        return await asyncio.shield(future)
+
+    async def _drive(self, key: Hashable) -> None:
+        try:
+            while key in self._queued:
+                future, func, args = self._queued.pop(key)
+                self.executed += 1
+                try:
+                    result = await func(*args)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    future.set_exception(e)
+                    # every waiter might have been cancelled already
+                    future.exception()
+                else:
+                    future.set_result(result)
+        finally:
+            self._running.discard(key)
@@ -0,0 +1,31 @@
+from typing import Any, Dict, List
+
+
+class CounterRegistry:
+    """Queues, batchers and the like, by name, so that what they have
+    been doing can be inspected in one place. Each one has a counters()
+    method that returns a dict of numbers."""
+
+    def __init__(self):
+        self.objects: Dict[str, Any] = {}
+
+    def register(self, name: str, obj: Any) -> Any:
+        self.objects[name] = obj
+        return obj
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: o.counters() for name, o in self.objects.items()}
+
+    @staticmethod
+    def merge(all_stats: List[Dict[str, Dict[str, int]]]):
+        """Adds up the counters of several processes."""
+        result: Dict[str, Dict[str, int]] = {}
+        for stats in all_stats:
+            for name, values in stats.items():
+                merged = result.setdefault(name, {})
+                for key, value in values.items():
+                    merged[key] = merged.get(key, 0) + value
+        return result
+
+
+counters = CounterRegistry()
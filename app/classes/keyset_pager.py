@@ -0,0 +1,81 @@
+from typing import Any, Awaitable, Callable, List, Optional
+
+# fetch(limit, offset, after, before)
+_Fetch = Callable[[int, int, Any, Any], Awaitable[List[Any]]]
+
+
+class KeysetPager:
+    """Rows of an ordered query, by index, for results that are too
+    big to fetch all at once.
+
+    Only a window of up to max_rows rows is held. Moving past either
+    end of it fetches the next chunk from the row at that end (so the
+    query can continue from the row's key instead of an offset), and
+    anything further away is jumped to with an offset."""
+
+    def __init__(
+        self, fetch: _Fetch, chunk_size: int = 25, max_rows: int = 100
+    ):
+        self._fetch = fetch
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+
+        self._rows: List[Any] = []
+        # the index of _rows[0]
+        self._start = 0
+        # whether _rows ends with the last row
+        self._done = False
+
+    async def get(self, index: int) -> Optional[Any]:
+        if index < 0:
+            return None
+        end = self._start + len(self._rows)
+        if (
+            not self._rows
+            or index < self._start - self.chunk_size
+            or index >= end + self.chunk_size
+        ):
+            await self._jump(index)
+        elif index < self._start:
+            await self._fetch_before()
+        elif index >= end and not self._done:
+            await self._fetch_after()
+
+        i = index - self._start
+        if 0 <= i < len(self._rows):
+            return self._rows[i]
+        return None
+
+    async def remove(self, index: int) -> None:
+        """Skips a row, so that index refers to the one after it."""
+        i = index - self._start
+        if not 0 <= i < len(self._rows):
+            return
+        if i == len(self._rows) - 1 and not self._done:
+            # it is still needed to continue from
+            await self._fetch_after()
+        del self._rows[i]
+
+    async def _jump(self, index: int) -> None:
+        self._rows = await self._fetch(self.chunk_size, index, None, None)
+        self._start = index
+        self._done = len(self._rows) < self.chunk_size
+
+    async def _fetch_after(self) -> None:
+        rows = await self._fetch(self.chunk_size, 0, self._rows[-1], None)
+        self._done = len(rows) < self.chunk_size
+        self._rows.extend(rows)
+        extra = len(self._rows) - self.max_rows
+        if extra > 0:
+            del self._rows[:extra]
+            self._start += extra
+
+    async def _fetch_before(self) -> None:
+        # these come closest first
+        rows = await self._fetch(self.chunk_size, 0, None, self._rows[0])
+        rows.reverse()
+        self._rows[:0] = rows
+        self._start -= len(rows)
+        if len(self._rows) > self.max_rows:
+            del self._rows[self.max_rows :]
+            self._done = False
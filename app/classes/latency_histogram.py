@@ -0,0 +1,125 @@
+import math
+from typing import Any, Dict, List, Optional
+
+# the first bucket holds everything up to 10µs, and each bucket after
+# it is ~19% wider than the one before, up to ~10s for the last one
+_MIN = 0.00001
+_GROWTH = 2**0.25
+_LOG_GROWTH = math.log(_GROWTH)
+BUCKETS = 81
+
+
+class LatencyHistogram:
+    """Durations (in seconds), counted in log sized buckets.
+
+    Uses the same memory no matter how many values are added. Each
+    percentile is the upper bound of its bucket, so it is never more
+    than one bucket (~19%) above the real value."""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        if value <= _MIN:
+            index = 0
+        else:
+            index = min(
+                BUCKETS - 1, math.ceil(math.log(value / _MIN) / _LOG_GROWTH)
+            )
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_MIN * _GROWTH**index, self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, n in enumerate(other.buckets):
+            self.buckets[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            # only the buckets that have something in them
+            "buckets": {i: n for i, n in enumerate(self.buckets) if n},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        hist = cls()
+        for index, n in data["buckets"].items():
+            # keys become strings when sent as json
+            hist.buckets[int(index)] = n
+        hist.count = data["count"]
+        hist.total = data["total"]
+        hist.max = data["max"]
+        return hist
+
+
+class StatementStats:
+    """How long a statement took to run, how long it waited for a
+    connection first, and how many rows it returned or changed."""
+
+    __slots__ = ("exec", "wait", "rows")
+
+    def __init__(
+        self,
+        exec_hist: Optional[LatencyHistogram] = None,
+        wait_hist: Optional[LatencyHistogram] = None,
+        rows: int = 0,
+    ):
+        self.exec = exec_hist or LatencyHistogram()
+        self.wait = wait_hist or LatencyHistogram()
+        self.rows = rows
+
+    def add(self, exec_time: float, wait_time: float, rows: int) -> None:
+        self.exec.add(exec_time)
+        self.wait.add(wait_time)
+        self.rows += rows
+
+    def merge(self, other: "StatementStats") -> None:
+        self.exec.merge(other.exec)
+        self.wait.merge(other.wait)
+        self.rows += other.rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "exec": self.exec.to_dict(),
+            "wait": self.wait.to_dict(),
+            "rows": self.rows,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StatementStats":
+        return cls(
+            LatencyHistogram.from_dict(data["exec"]),
+            LatencyHistogram.from_dict(data["wait"]),
+            data["rows"],
+        )
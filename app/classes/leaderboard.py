@@ -0,0 +1,66 @@
+import bisect
+from typing import Dict, Iterable, List, Tuple
+
+
+class Leaderboard:
+    """The top members of a guild by xp, kept in order as their xp
+    changes so that it doesn't have to be queried again.
+
+    Members with the same xp are ordered by user id, the same way the
+    query that loads it orders them."""
+
+    __slots__ = ("size", "complete", "_keys", "_entries")
+
+    def __init__(self, rows: Iterable[Tuple[int, int, int]], size: int):
+        """rows are (user_id, xp, level), already in order."""
+        self.size = size
+        # (-xp, user_id), so that the best member comes first
+        self._keys: List[Tuple[int, int]] = []
+        self._entries: Dict[int, Tuple[int, int]] = {}
+        for user_id, xp, level in rows:
+            self._keys.append((-xp, user_id))
+            self._entries[user_id] = (xp, level)
+        # whether every member with xp is on it
+        self.complete = len(self._keys) < size
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, user_id: int, xp: int, level: int) -> bool:
+        """Moves the member to where their new xp puts them. Returns
+        False if someone that isn't on the board might now belong on
+        it, in which case it has to be loaded again."""
+
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old[0], user_id))]
+
+        key = (-xp, user_id)
+        if xp > 0 and (self.complete or (self._keys and key < self._keys[-1])):
+            bisect.insort(self._keys, key)
+            self._entries[user_id] = (xp, level)
+            if len(self._keys) > self.size:
+                _, dropped = self._keys.pop()
+                del self._entries[dropped]
+                self.complete = False
+            return True
+
+        # they aren't on the board, and if they just dropped off of it
+        # there's no telling who should take their place
+        return old is None or self.complete
+
+    def set_level(self, user_id: int, level: int) -> None:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = (entry[0], level)
+
+    def page(self, start: int, stop: int) -> List[Tuple[int, int, int, int]]:
+        """(rank, user_id, xp, level) of each member from start to
+        stop. Members with the same xp share the best of their ranks,
+        like members.get_rank() counts them."""
+        result = []
+        for neg_xp, user_id in self._keys[start:stop]:
+            # everyone with more xp is on the board too
+            rank = bisect.bisect_left(self._keys, (neg_xp,)) + 1
+            result.append((rank, user_id, *self._entries[user_id]))
+        return result
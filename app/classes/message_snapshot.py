@@ -0,0 +1,213 @@
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+import discord
+
+from app.classes.cache_registry import _sizeof
+
+# the parts of an embed that the starboard reads
+_EMBED_KEYS = (
+    "type",
+    "title",
+    "url",
+    "description",
+    "fields",
+    "footer",
+    "image",
+    "thumbnail",
+)
+
+# the payload had no referenced_message (not even a null one)
+_MISSING: Any = object()
+
+
+class MessageSnapshot:
+    """The parts of a message payload that the bot actually reads.
+
+    Caching these instead of discord.Message objects (which hold on to
+    embeds, attachments, member and state objects) takes a small
+    fraction of the memory. to_message() turns it back into a normal
+    discord.Message, which can still be edited, deleted, etc.
+
+    Everything discord.Message reads is kept, except for application,
+    activity, nonce, the embed keys that aren't in _EMBED_KEYS and the
+    attachment keys other than id, filename, url, proxy_url, size, width
+    and height. The author only keeps id, username, discriminator,
+    avatar and bot."""
+
+    __slots__ = (
+        "id",
+        "type",
+        "content",
+        "author",
+        "member",
+        "webhook_id",
+        "attachments",
+        "embeds",
+        "reactions",
+        "reference",
+        "referenced",
+        "mentions",
+        "mention_roles",
+        "mention_everyone",
+        "stickers",
+        "tts",
+        "edited_timestamp",
+        "pinned",
+        "flags",
+        "size",
+    )
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = int(data["id"])
+        self.type: int = data["type"]
+        self.content: str = data["content"]
+
+        a = data["author"]
+        # (id, username, discriminator, avatar, bot)
+        self.author: Tuple = (
+            a["id"],
+            a["username"],
+            a["discriminator"],
+            a.get("avatar"),
+            a.get("bot", False),
+        )
+        m = data.get("member")
+        # (nick, roles, joined_at)
+        self.member: Optional[Tuple] = (
+            (m.get("nick"), tuple(m["roles"]), m.get("joined_at"))
+            if m
+            else None
+        )
+        self.webhook_id: Optional[str] = data.get("webhook_id")
+
+        # (id, filename, url, proxy_url, size, width, height)
+        self.attachments = tuple(
+            (
+                a["id"],
+                a["filename"],
+                a["url"],
+                a.get("proxy_url"),
+                a["size"],
+                a.get("width"),
+                a.get("height"),
+            )
+            for a in data["attachments"]
+        )
+        self.embeds: Optional[str] = (
+            json.dumps(
+                [
+                    {k: e[k] for k in _EMBED_KEYS if k in e}
+                    for e in data["embeds"]
+                ]
+            )
+            if data["embeds"]
+            else None
+        )
+        # (emoji, count, me)
+        self.reactions = tuple(
+            (r["emoji"], r.get("count", 1), r.get("me", False))
+            for r in data.get("reactions", [])
+        )
+        ref = data.get("message_reference")
+        # (message_id, channel_id, guild_id)
+        self.reference: Optional[Tuple] = (
+            (ref.get("message_id"), ref["channel_id"], ref.get("guild_id"))
+            if ref
+            else None
+        )
+        self.mentions = tuple(data.get("mentions", ()))
+        self.mention_roles = tuple(data.get("mention_roles", ()))
+        self.mention_everyone: bool = data.get("mention_everyone", False)
+        self.stickers = tuple(data.get("stickers", ()))
+        self.tts: bool = data.get("tts", False)
+        self.edited_timestamp: Optional[str] = data.get("edited_timestamp")
+        self.pinned: bool = data.get("pinned", False)
+        self.flags: int = data.get("flags", 0)
+
+        # deep enough to reach the strings in each reaction's emoji
+        self.size = _sizeof(self, 4)
+
+        # the message this one replies to. None if it was deleted
+        self.referenced: Optional[MessageSnapshot] = _MISSING
+        if "referenced_message" in data:
+            resolved = data["referenced_message"]
+            self.referenced = (
+                MessageSnapshot(resolved) if resolved is not None else None
+            )
+            if self.referenced is not None:
+                self.size += self.referenced.size
+
+    @staticmethod
+    def sizeof(snapshot: Optional["MessageSnapshot"]) -> int:
+        """For caches that are limited by memory instead of items."""
+        if snapshot is None:
+            return sys.getsizeof(None)
+        return snapshot.size
+
+    def to_payload(self) -> Dict[str, Any]:
+        """A new message payload, with the fields that were kept."""
+        a_id, username, discriminator, avatar, bot = self.author
+        data = {
+            "id": str(self.id),
+            "type": self.type,
+            "content": self.content,
+            "author": {
+                "id": a_id,
+                "username": username,
+                "discriminator": discriminator,
+                "avatar": avatar,
+                "bot": bot,
+            },
+            "attachments": [
+                {
+                    "id": a[0],
+                    "filename": a[1],
+                    "url": a[2],
+                    "proxy_url": a[3],
+                    "size": a[4],
+                    "width": a[5],
+                    "height": a[6],
+                }
+                for a in self.attachments
+            ],
+            "embeds": json.loads(self.embeds) if self.embeds else [],
+            "reactions": [
+                {"emoji": emoji, "count": count, "me": me}
+                for emoji, count, me in self.reactions
+            ],
+            "mentions": list(self.mentions),
+            "mention_roles": list(self.mention_roles),
+            "mention_everyone": self.mention_everyone,
+            "stickers": list(self.stickers),
+            "tts": self.tts,
+            "edited_timestamp": self.edited_timestamp,
+            "pinned": self.pinned,
+            "flags": self.flags,
+        }
+        if self.member:
+            nick, roles, joined_at = self.member
+            data["member"] = {
+                "nick": nick,
+                "roles": list(roles),
+                "joined_at": joined_at,
+            }
+        if self.webhook_id:
+            data["webhook_id"] = self.webhook_id
+        if self.reference:
+            message_id, channel_id, guild_id = self.reference
+            data["message_reference"] = {
+                "message_id": message_id,
+                "channel_id": channel_id,
+                "guild_id": guild_id,
+            }
+        if self.referenced is None:
+            data["referenced_message"] = None
+        elif self.referenced is not _MISSING:
+            data["referenced_message"] = self.referenced.to_payload()
+        return data
+
+    def to_message(self, channel: discord.TextChannel) -> discord.Message:
+        state = channel._state
+        return state.create_message(channel=channel, data=self.to_payload())
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+_Job = Callable[[], Awaitable[Any]]
+
+
+class _Channel:
+    __slots__ = ("sends", "edits", "worker")
+
+    def __init__(self):
+        self.sends: Deque[Tuple[_Job, asyncio.Future]] = deque()
+        # message_id -> the newest edit for that message
+        self.edits: "OrderedDict[int, _Job]" = OrderedDict()
+        self.worker: asyncio.Task = None
+
+    def __len__(self) -> int:
+        return len(self.sends) + len(self.edits)
+
+
+class OutboundQueue:
+    """Sends the requests for each starboard channel one at a time.
+
+    Discord rate limits message sends and edits per channel, so firing
+    them all at once only makes them wait inside the http client. This
+    queues them instead: new starboard messages always go first, and
+    edits are only kept for as long as nothing newer replaces them, so
+    a message that is edited ten times while the channel is busy only
+    gets edited once."""
+
+    def __init__(self, log: logging.Logger):
+        self.log = log
+        self._channels: Dict[int, _Channel] = {}
+
+        self.sent = 0
+        self.edited = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(c) for c in self._channels.values())
+
+    def channel_depths(self) -> Dict[int, int]:
+        return {cid: len(c) for cid, c in self._channels.items()}
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._channels),
+            "depth": self.depth,
+            "sent": self.sent,
+            "edited": self.edited,
+            "dropped": self.dropped,
+        }
+
+    async def send(self, channel_id: int, func: _Job) -> Any:
+        """Queues func() ahead of any edits and waits for its result."""
+
+        future = asyncio.get_event_loop().create_future()
+        self._channel(channel_id).sends.append((func, future))
+        return await asyncio.shield(future)
+
+    def edit(self, channel_id: int, message_id: int, func: _Job) -> None:
+        """Queues func() as the edit for message_id, replacing any edit
+        for it that hasn't started yet. Doesn't wait for it to run."""
+
+        channel = self._channel(channel_id)
+        if message_id in channel.edits:
+            self.dropped += 1
+        # keeps the old position, so busy messages can't starve others
+        channel.edits[message_id] = func
+
+    async def close(self, timeout: float = 10) -> None:
+        """Waits up to timeout seconds for the queues to drain, then
+        gives up on the rest. Edits that never ran count as dropped, and
+        sends that never ran raise CancelledError in whoever is waiting
+        for them."""
+
+        workers = [c.worker for c in self._channels.values() if c.worker]
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+
+        cancelled = []
+        for channel in list(self._channels.values()):
+            self.dropped += len(channel.edits)
+            channel.edits.clear()
+            for _, future in channel.sends:
+                future.cancel()
+            channel.sends.clear()
+            if channel.worker is not None:
+                channel.worker.cancel()
+                cancelled.append(channel.worker)
+        await asyncio.gather(*cancelled, return_exceptions=True)
+        self._channels.clear()
+
+    def _channel(self, channel_id: int) -> _Channel:
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = _Channel()
+        if channel.worker is None:
+            channel.worker = asyncio.create_task(self._drain(channel_id))
+        return channel
+
+    async def _drain(self, channel_id: int) -> None:
+        channel = self._channels[channel_id]
+        try:
+            while True:
+                if channel.sends:
+                    func, future = channel.sends.popleft()
+                    self.sent += 1
+                    try:
+                        result = await func()
+                    except asyncio.CancelledError:
+                        future.cancel()
+                        raise
+                    except Exception as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+                elif channel.edits:
+                    _, func = channel.edits.popitem(last=False)
+                    try:
+                        await func()
+                    except asyncio.CancelledError:
+                        self.dropped += 1
+                        raise
+                    except Exception:
+                        self.log.exception(
+                            f"Failed to edit a message in {channel_id}"
+                        )
+                    self.edited += 1
+                else:
+                    break
+        finally:
+            channel.worker = None
+            if not channel:
+                self._channels.pop(channel_id, None)
@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PERM_KEYS = (
+    "allow_commands",
+    "on_starboard",
+    "give_stars",
+    "gain_xp",
+    "pos_roles",
+    "xp_roles",
+)
+_ALL = (1 << len(PERM_KEYS)) - 1
+
+
+class PermGroupMatrix:
+    """A permgroup, with each permrole stored as two bitmasks: which
+    permissions it sets, and what it sets them to."""
+
+    __slots__ = ("channels", "starboards", "roles")
+
+    def __init__(
+        self, sql_group: Dict[str, Any], sql_permroles: List[Dict[str, Any]]
+    ):
+        self.channels = frozenset(int(c) for c in sql_group["channels"] or [])
+        self.starboards = frozenset(
+            int(s) for s in sql_group["starboards"] or []
+        )
+        # role_id -> (index, set mask, value mask)
+        self.roles: Dict[int, Tuple[int, int, int]] = {}
+        for pr in sql_permroles:
+            mask = value = 0
+            for bit, key in enumerate(PERM_KEYS):
+                if pr[key] is None:
+                    continue
+                mask |= 1 << bit
+                if pr[key]:
+                    value |= 1 << bit
+            self.roles[int(pr["role_id"])] = (pr["index"], mask, value)
+
+    def applies(
+        self, channel_id: Optional[int], starboard_id: Optional[int]
+    ) -> bool:
+        if self.channels and channel_id is not None:
+            if channel_id not in self.channels:
+                return False
+        if self.starboards and starboard_id is not None:
+            if starboard_id not in self.starboards:
+                return False
+        return True
+
+
+class PermMatrix:
+    """Every permgroup of a guild, compiled so that resolving a member's
+    permissions doesn't need the database.
+
+    Built once and thrown away whenever PermGroups.edited() is called
+    for the guild."""
+
+    __slots__ = ("groups", "roles")
+
+    def __init__(
+        self,
+        sql_groups: Iterable[Dict[str, Any]],
+        sql_permroles: Iterable[Dict[str, Any]],
+    ):
+        by_group: Dict[int, List[Dict[str, Any]]] = {}
+        for pr in sql_permroles:
+            by_group.setdefault(int(pr["permgroup_id"]), []).append(pr)
+
+        groups = sorted(sql_groups, key=lambda g: g["index"])
+        self.groups = tuple(
+            PermGroupMatrix(g, by_group.get(int(g["id"]), [])) for g in groups
+        )
+        # every role that has a permrole somewhere
+        self.roles = frozenset(r for g in self.groups for r in g.roles)
+
+    def resolve(
+        self,
+        roles: Iterable[int],
+        channel_id: Optional[int],
+        starboard_id: Optional[int],
+    ) -> Dict[str, bool]:
+        roles = self.roles.intersection(roles)
+        perms = _ALL
+        if roles:
+            channel_id = int(channel_id) if channel_id else None
+            starboard_id = int(starboard_id) if starboard_id else None
+            for group in self.groups:
+                if not group.applies(channel_id, starboard_id):
+                    continue
+                hits = sorted(
+                    group.roles[r] for r in roles if r in group.roles
+                )
+                for _, mask, value in hits:
+                    perms = (perms & ~mask) | (value & mask)
+
+        return {
+            key: bool(perms >> bit & 1) for bit, key in enumerate(PERM_KEYS)
+        }
@@ -0,0 +1,219 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.classes.cache_registry import CountedTTLCache, caches
+
+# user_id -> the star emojis they reacted with
+_Counter = Dict[int, Set[str]]
+# (added, user_id, emoji), or (None, user_id, "") for an ignored user
+_Journal = List[Tuple[Optional[bool], int, str]]
+
+
+class _UserIndex(CountedTTLCache):
+    """(guild_id, user_id) -> ids of the messages with a counter that
+    the user is in. Calls on_evict for users dropped to make room, since
+    their counters can't be found anymore."""
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: int,
+        on_evict: Callable[[Tuple[int, int], Set[int]], None],
+    ):
+        super().__init__(maxsize, ttl)
+        self.on_evict = on_evict
+
+    def popitem(self) -> Any:
+        key, messages = super().popitem()
+        self.on_evict(key, messages)
+        return key, messages
+
+
+class PointCounters:
+    """Keeps the valid points of a message on each starboard in memory,
+    so new reactions can update them instead of recounting everything.
+
+    A counter is only ever created from a full count. Reactions that
+    come in while a count is running are journaled and replayed on top
+    of it, so the result is correct no matter which of them the count
+    already saw.
+
+    Each counter also remembers the users whose reactions weren't
+    counted (because they couldn't give stars or weren't members), and
+    every user on a counter is indexed, so that forget_user() can drop
+    every counter a change to a member could affect."""
+
+    def __init__(self, maxsize: int = 5_000, ttl: int = 300):
+        # message_id -> starboard_id ->
+        # (signature, counter, ignored, guild_id)
+        self._counters = caches.register(
+            "point_counters", CountedTTLCache(maxsize, ttl)
+        )
+        # entries are set again whenever they change, so they always
+        # expire after the counters they point to
+        self._users = caches.register(
+            "point_counters.users",
+            _UserIndex(maxsize * 50, ttl, self._forget_counters),
+        )
+        # (message_id, starboard_id) -> (guild_id, journal)
+        self._building: Dict[Tuple[int, int], Tuple[int, _Journal]] = {}
+
+    def get(
+        self, message_id: int, starboard_id: int, signature: Hashable
+    ) -> Optional[int]:
+        """Returns the points, or None if they need to be counted.
+
+        The signature describes the starboard settings the counter was
+        built with, so that changing them forces a recount."""
+        counter = self._counters.get(message_id, {}).get(starboard_id)
+        if counter is None or counter[0] != signature:
+            return None
+        return len(counter[1])
+
+    def tracking(self, message_id: int, starboard_id: int) -> bool:
+        return (
+            starboard_id in self._counters.get(message_id, {})
+            or (message_id, starboard_id) in self._building
+        )
+
+    def start_build(
+        self, guild_id: int, message_id: int, starboard_id: int
+    ) -> Optional[_Journal]:
+        """Returns the journal to pass to finish_build, or None if a
+        count is already running."""
+        key = (message_id, starboard_id)
+        if key in self._building:
+            return None
+        journal: _Journal = []
+        self._building[key] = (guild_id, journal)
+        return journal
+
+    def finish_build(
+        self,
+        message_id: int,
+        starboard_id: int,
+        signature: Hashable,
+        counter: _Counter,
+        ignored: Set[int],
+        journal: _Journal,
+    ) -> int:
+        key = (message_id, starboard_id)
+        if self._journal(key) is not journal:
+            # forgotten while counting, so don't trust the result
+            return len(counter)
+        guild_id, _ = self._building.pop(key)
+        for added, user_id, emoji in journal:
+            if added is None:
+                ignored.add(user_id)
+            else:
+                self._apply(counter, added, user_id, emoji)
+
+        starboards = self._counters.get(message_id)
+        if starboards is None:
+            starboards = self._counters[message_id] = {}
+        starboards[starboard_id] = (signature, counter, ignored, guild_id)
+        for user_id in (*counter, *ignored):
+            self._index(guild_id, user_id, message_id)
+        return len(counter)
+
+    def cancel_build(
+        self, message_id: int, starboard_id: int, journal: _Journal
+    ) -> None:
+        key = (message_id, starboard_id)
+        if self._journal(key) is journal:
+            del self._building[key]
+
+    def add(
+        self, message_id: int, starboard_id: int, user_id: int, emoji: str
+    ) -> None:
+        """Records a valid reaction. Ignored if nothing is tracked."""
+        self._update(message_id, starboard_id, True, user_id, emoji)
+
+    def remove(
+        self, message_id: int, starboard_id: int, user_id: int, emoji: str
+    ) -> None:
+        self._update(message_id, starboard_id, False, user_id, emoji)
+
+    def ignore(self, message_id: int, starboard_id: int, user_id: int):
+        """Records a reaction that wasn't counted."""
+        journal = self._journal((message_id, starboard_id))
+        if journal is not None:
+            journal.append((None, user_id, ""))
+
+        counter = self._counters.get(message_id, {}).get(starboard_id)
+        if counter is not None:
+            counter[2].add(user_id)
+            self._index(counter[3], user_id, message_id)
+
+    def forget(self, message_id: int) -> None:
+        """Drops the counters of a message so that it gets recounted."""
+        self._counters.pop(message_id, None)
+        for key in [k for k in self._building if k[0] == message_id]:
+            del self._building[key]
+
+    def forget_user(self, guild_id: int, user_id: int) -> None:
+        """Drops every counter in the guild that the user reacted to,
+        for when something that decides whether they can give stars
+        there changed."""
+        key = (guild_id, user_id)
+        self._forget_counters(key, self._users.pop(key, set()))
+        # any count running in the guild might have seen the old state
+        for k in [k for k, b in self._building.items() if b[0] == guild_id]:
+            del self._building[k]
+
+    def _forget_counters(self, key: Tuple[int, int], messages: Set[int]):
+        _, user_id = key
+        for message_id in messages:
+            starboards = self._counters.get(message_id)
+            if starboards is None:
+                continue
+            for starboard_id, (_, counter, ignored, _) in list(
+                starboards.items()
+            ):
+                if user_id in counter or user_id in ignored:
+                    del starboards[starboard_id]
+            if not starboards:
+                self._counters.pop(message_id, None)
+
+    def _index(self, guild_id: int, user_id: int, message_id: int) -> None:
+        key = (guild_id, user_id)
+        messages = self._users.get(key)
+        if messages is None:
+            messages = set()
+        messages.add(message_id)
+        # setting it again restarts its ttl
+        self._users[key] = messages
+
+    def _journal(self, key: Tuple[int, int]) -> Optional[_Journal]:
+        building = self._building.get(key)
+        return building[1] if building is not None else None
+
+    def _update(
+        self,
+        message_id: int,
+        starboard_id: int,
+        added: bool,
+        user_id: int,
+        emoji: str,
+    ) -> None:
+        journal = self._journal((message_id, starboard_id))
+        if journal is not None:
+            journal.append((added, user_id, emoji))
+
+        counter = self._counters.get(message_id, {}).get(starboard_id)
+        if counter is not None:
+            self._apply(counter[1], added, user_id, emoji)
+            if added:
+                self._index(counter[3], user_id, message_id)
+
+    @staticmethod
+    def _apply(counter: _Counter, added: bool, user_id: int, emoji: str):
+        if added:
+            counter.setdefault(user_id, set()).add(emoji)
+            return
+
+        emojis = counter.get(user_id)
+        if emojis is None:
+            return
+        emojis.discard(emoji)
+        if not emojis:
+            del counter[user_id]
@@ -0,0 +1,93 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class StarboardRule:
+    """The parts of a starboard needed to validate a reaction."""
+
+    __slots__ = (
+        "id",
+        "locked",
+        "channel_wl",
+        "channel_bl",
+        "self_star",
+        "allow_bots",
+        "remove_invalid",
+    )
+
+    def __init__(self, sql_starboard: Dict[str, Any]):
+        self.id = int(sql_starboard["id"])
+        self.locked: bool = sql_starboard["locked"]
+        self.channel_wl = frozenset(
+            int(c) for c in sql_starboard["channel_wl"]
+        )
+        self.channel_bl = frozenset(
+            int(c) for c in sql_starboard["channel_bl"]
+        )
+        self.self_star: bool = sql_starboard["self_star"]
+        self.allow_bots: bool = sql_starboard["allow_bots"]
+        self.remove_invalid: bool = sql_starboard["remove_invalid"]
+
+    def watches(self, channel_id: int) -> bool:
+        if self.channel_wl:
+            return channel_id in self.channel_wl
+        return channel_id not in self.channel_bl
+
+    def __repr__(self) -> str:
+        return f"<StarboardRule id={self.id}>"
+
+
+class GuildRules:
+    """All starboards of a guild, compiled for fast reaction checks.
+
+    Built once from the starboards table and thrown away whenever
+    Starboards.edited() is called for the guild."""
+
+    __slots__ = ("starboards", "emojis")
+
+    def __init__(self, sql_starboards: Iterable[Dict[str, Any]]):
+        self.starboards: Dict[int, StarboardRule] = {}
+        emojis: Dict[str, List[StarboardRule]] = {}
+        for s in sql_starboards:
+            rule = StarboardRule(s)
+            self.starboards[rule.id] = rule
+            for emoji in s["star_emojis"] or []:
+                emojis.setdefault(emoji, []).append(rule)
+
+        self.emojis: Dict[str, Tuple[StarboardRule, ...]] = {
+            emoji: tuple(rules) for emoji, rules in emojis.items()
+        }
+
+    def candidates(self, emoji: str, channel_id: int) -> List[StarboardRule]:
+        """The unlocked starboards that would count this reaction."""
+        return [
+            rule
+            for rule in self.emojis.get(emoji, ())
+            if not rule.locked and rule.watches(channel_id)
+        ]
+
+    @staticmethod
+    def check(
+        candidates: List[StarboardRule],
+        giver_id: int,
+        author_id: int,
+        author_is_bot: bool,
+        frozen: bool,
+        trashed: bool,
+    ) -> Tuple[List[StarboardRule], bool]:
+        """Runs every check that doesn't need permissions.
+
+        Returns the starboards that passed (and still need their
+        permissions checked), and whether the reaction should be
+        removed if none of them end up passing."""
+
+        remove = all(rule.remove_invalid for rule in candidates)
+        if frozen or trashed:
+            return [], remove
+
+        passed = [
+            rule
+            for rule in candidates
+            if (rule.self_star or giver_id != author_id)
+            and (rule.allow_bots or not author_is_bot)
+        ]
+        return passed, remove
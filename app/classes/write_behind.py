@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+_Changes = Dict[Hashable, Tuple[int, ...]]
+
+# a batch that failed this many times in a row is dropped
+MAX_RETRIES = 3
+
+
+class WriteBehind:
+    """Adds up numeric changes per key in memory, and hands them to
+    flush() in one batch at most every `interval` seconds instead of
+    writing each change as it happens.
+
+    A batch that fails is merged back into the pending changes, so that
+    it is retried with the next one."""
+
+    def __init__(
+        self,
+        flush: Callable[[_Changes], Awaitable[None]],
+        interval: float,
+        log: logging.Logger,
+    ):
+        self._flush = flush
+        self.interval = interval
+        self.log = log
+
+        self._pending: _Changes = {}
+        self._timer: Optional[asyncio.Task] = None
+        # so that batches are written in order
+        self._lock = asyncio.Lock()
+        self._failures = 0
+
+        self.added = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, key: Hashable, changes: Tuple[int, ...]) -> None:
+        self.added += 1
+        self._merge(key, changes)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._wait())
+
+    def _merge(self, key: Hashable, changes: Tuple[int, ...]) -> None:
+        old = self._pending.get(key)
+        if old is not None:
+            changes = tuple(a + b for a, b in zip(old, changes))
+        self._pending[key] = changes
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+        finally:
+            if self._timer is asyncio.current_task():
+                self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self.flushes += 1
+            try:
+                await self._flush(batch)
+            except Exception:
+                self._failures += 1
+                if self._failures >= MAX_RETRIES:
+                    self._failures = 0
+                    self.dropped += len(batch)
+                    self.log.exception(
+                        f"Dropping {len(batch)} buffered changes"
+                    )
+                    return
+                self.log.exception(
+                    f"Failed to write {len(batch)} buffered changes"
+                )
+                for key, changes in batch.items():
+                    self._merge(key, changes)
+                if self._timer is None:
+                    self._timer = asyncio.create_task(self._wait())
+                return
+            self._failures = 0
+            self.flushed += len(batch)
+
+    async def close(self) -> None:
+        """Stops the timer and writes whatever is still pending."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
@@ -115,6 +115,12 @@ async def get_proper_posrole(
     return None, None, []
 
 
+# members whose roles are updated per guild each tick. role edits are
+# rate limited per guild, so the rest waits for the next ticks instead
+# of all of them going out at once
+MEMBERS_PER_TICK = 1
+
+
 class PREvents(commands.Cog):
     def __init__(self, bot: "Bot"):
         self.bot = bot
@@ -147,59 +153,62 @@ class PREvents(commands.Cog):
     @tasks.loop(seconds=5)
     async def update_pos_roles(self):
         for gid in list(self.queue.keys()):
-            to_update = self.queue[gid]
-            if len(to_update) == 0:
-                del self.queue[gid]
-                continue
-
-            n = to_update.pop()
+            queued = list(dict.fromkeys(self.queue.pop(gid)))
             guild: discord.Guild = self.bot.get_guild(gid)
-            sql_guild = await self.bot.db.guilds.get(guild.id)
-            _member = await self.bot.cache.get_members([n], guild)
-            if n not in _member:
+            if guild is None:
                 continue
-            member = _member[n]
-
-            perms = await pr_functions.get_perms(
+            to_update = queued[:MEMBERS_PER_TICK]
+            if len(queued) > MEMBERS_PER_TICK:
+                self.queue[gid] = queued[MEMBERS_PER_TICK:]
+            sql_guild = await self.bot.db.guilds.get(guild.id)
+            members = list(
+                (await self.bot.cache.get_members(to_update, guild)).values()
+            )
+            all_perms = await pr_functions.get_perms_many(
                 self.bot,
-                [r.id for r in member.roles],
-                member.guild.id,
+                [[r.id for r in m.roles] for m in members],
+                gid,
                 None,
                 None,
             )
-            if perms["pos_roles"]:
-                role, replaced, stacked = await get_proper_posrole(
-                    self.bot,
-                    guild,
-                    member.id,
-                    (await self.bot.db.members.get(member.id, guild.id))["xp"],
-                )
-            else:
-                role = replaced = None
-                stacked = []
-
             _all_posroles = await self.bot.db.posroles.get_many(guild.id)
-            to_remove = [guild.get_role(r["role_id"]) for r in _all_posroles]
-
-            if sql_guild["stack_pos_roles"]:
-                for srole in stacked:
-                    if srole in to_remove:
-                        to_remove.remove(srole)
-
-            if role:
-                role = guild.get_role(role)
-                to_remove.remove(role)
-                to_add = [role]
-            else:
-                to_add = []
-
-            await add_pr(member, self.bot, *to_add)
-            await remove_pr(member, self.bot, *to_remove)
-            if sql_guild["stack_pos_roles"]:
-                await member.add_roles(*stacked, reason="PosRole stacking.")
-
-            if replaced:
-                self.bot.dispatch("update_pr", guild.id, replaced)
+            for member, perms in zip(members, all_perms):
+                if perms["pos_roles"]:
+                    sql_member = await self.bot.db.members.get(
+                        member.id, guild.id
+                    )
+                    role, replaced, stacked = await get_proper_posrole(
+                        self.bot, guild, member.id, sql_member["xp"]
+                    )
+                else:
+                    role = replaced = None
+                    stacked = []
+
+                to_remove = [
+                    guild.get_role(r["role_id"]) for r in _all_posroles
+                ]
+
+                if sql_guild["stack_pos_roles"]:
+                    for srole in stacked:
+                        if srole in to_remove:
+                            to_remove.remove(srole)
+
+                if role:
+                    role = guild.get_role(role)
+                    to_remove.remove(role)
+                    to_add = [role]
+                else:
+                    to_add = []
+
+                await add_pr(member, self.bot, *to_add)
+                await remove_pr(member, self.bot, *to_remove)
+                if sql_guild["stack_pos_roles"]:
+                    await member.add_roles(
+                        *stacked, reason="PosRole stacking."
+                    )
+
+                if replaced:
+                    self.bot.dispatch("update_pr", guild.id, replaced)
 
 
 def setup(bot: "Bot"):
@@ -25,6 +25,11 @@ async def set_xp_roles(
         pass
 
 
+# the most members per guild to give xp roles to every 5 seconds, so a
+# burst of xp doesn't turn into a burst of rate limited role edits
+MEMBERS_PER_TICK = 1
+
+
 class XPREvents(commands.Cog):
     def __init__(self, bot: "Bot"):
         self.bot = bot
@@ -58,71 +63,72 @@ class XPREvents(commands.Cog):
     async def update_xpr_loop(self):
         tasks: List[asyncio.Task] = []
         for gid in list(self.queue.keys()):
-            to_update = self.queue[gid]
-            if len(to_update) == 0:
-                del self.queue[gid]
-                continue
-            n = to_update.pop()
+            queued = list(dict.fromkeys(self.queue.pop(gid)))
             guild = self.bot.get_guild(gid)
-            _member = await self.bot.cache.get_members([n], guild)
-            if n not in _member:
+            if guild is None:
                 continue
-            member = _member[n]
-
-            perms = await pr_functions.get_perms(
+            to_update = queued[:MEMBERS_PER_TICK]
+            if len(queued) > MEMBERS_PER_TICK:
+                self.queue[gid] = queued[MEMBERS_PER_TICK:]
+            members = list(
+                (await self.bot.cache.get_members(to_update, guild)).values()
+            )
+            all_perms = await pr_functions.get_perms_many(
                 self.bot,
-                [r.id for r in member.roles],
-                member.guild.id,
+                [[r.id for r in m.roles] for m in members],
+                gid,
                 None,
                 None,
             )
-
-            if perms["xp_roles"]:
-                sql_member = await self.bot.db.members.get(
-                    member.id, member.guild.id
-                )
-                to_add = [
-                    int(r["role_id"])
-                    for r in await self.bot.db.fetch(
-                        """SELECT * FROM xproles
-                        WHERE guild_id=$1
-                        AND required <= $2
-                        ORDER BY required DESC""",
-                        gid,
-                        sql_member["xp"],
+            for member, perms in zip(members, all_perms):
+                if perms["xp_roles"]:
+                    sql_member = await self.bot.db.members.get(
+                        member.id, member.guild.id
                     )
-                ]
-                sql_guild = await self.bot.db.guilds.get(guild.id)
-                to_remove = [
-                    int(r["role_id"])
-                    for r in await self.bot.db.fetch(
-                        """SELECT * FROM xproles
-                        WHERE guild_id=$1
-                        AND required > $2""",
-                        gid,
-                        sql_member["xp"],
-                    )
-                ]
-                if not sql_guild["stack_xp_roles"]:
-                    if len(to_add) > 1:
-                        to_remove.extend(to_add[1:])
-                        to_add = [to_add[0]]
-
-            else:
-                to_add = []
-                to_remove = [
-                    int(r["role_id"])
-                    for r in (
-                        await self.bot.db.execute(
+                    to_add = [
+                        int(r["role_id"])
+                        for r in await self.bot.db.fetch(
                             """SELECT * FROM xproles
-                        WHERE guild_id=$1""",
+                            WHERE guild_id=$1
+                            AND required <= $2
+                            ORDER BY required DESC""",
                             gid,
+                            sql_member["xp"],
                         )
-                        or []
-                    )
-                ]
-            t = asyncio.create_task(set_xp_roles(to_add, to_remove, member))
-            tasks.append(t)
+                    ]
+                    sql_guild = await self.bot.db.guilds.get(guild.id)
+                    to_remove = [
+                        int(r["role_id"])
+                        for r in await self.bot.db.fetch(
+                            """SELECT * FROM xproles
+                            WHERE guild_id=$1
+                            AND required > $2""",
+                            gid,
+                            sql_member["xp"],
+                        )
+                    ]
+                    if not sql_guild["stack_xp_roles"]:
+                        if len(to_add) > 1:
+                            to_remove.extend(to_add[1:])
+                            to_add = [to_add[0]]
+
+                else:
+                    to_add = []
+                    to_remove = [
+                        int(r["role_id"])
+                        for r in (
+                            await self.bot.db.execute(
+                                """SELECT * FROM xproles
+                            WHERE guild_id=$1""",
+                                gid,
+                            )
+                            or []
+                        )
+                    ]
+                t = asyncio.create_task(
+                    set_xp_roles(to_add, to_remove, member)
+                )
+                tasks.append(t)
 
 
 def setup(bot: "Bot"):
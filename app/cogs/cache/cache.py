@@ -1,12 +1,19 @@
+import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 
-import cachetools
 import discord
 
 from app import utils
+from app.classes.async_cache import AsyncCache
 from app.classes.bot import Bot
+from app.classes.cache_registry import CountedTTLCache, caches
+from app.classes.message_snapshot import MessageSnapshot
 from app.constants import MISSING
 
+# how long to collect member lookups for a guild before querying them,
+# if that guild is already being queried
+MEMBER_BATCH_WINDOW = 0.05
+
 
 def cached(
     ttl: int,
@@ -14,8 +21,9 @@ def cached(
     *,
     cache_args: Tuple[int] = None,
     cache_kwargs: Tuple[str] = None,
+    stale_ttl: int = 0,
 ):
-    cache = cachetools.TTLCache(maxsize, ttl)
+    cache = AsyncCache(maxsize, ttl, stale_ttl)
 
     def get_cache_sig(args: List[Any], kwargs: Dict[Any, Any]) -> Tuple[Any]:
         result = []
@@ -29,17 +37,13 @@ def cached(
         return tuple(result)
 
     def wrapper(coro):
+        caches.register(f"cached.{coro.__qualname__}", cache)
+
         async def predicate(*args, **kwargs):
             sig = get_cache_sig(args, kwargs)
-            try:
-                return cache[sig]
-            except KeyError:
-                pass
-
-            result = await coro(*args, **kwargs)
-            cache[sig] = result
-            return result
+            return await cache.get(sig, lambda: coro(*args, **kwargs))
 
+        predicate.cache = cache
         return predicate
 
     return wrapper
@@ -47,8 +51,20 @@ def cached(
 
 class Cache:
     def __init__(self, bot: "Bot") -> None:
-        self.messages = cachetools.TTLCache(5_000, 30)
-        self.users = cachetools.TTLCache(5_000, 15)
+        # limited to ~16MB of snapshots rather than a number of messages
+        self.messages = caches.register(
+            "cache.messages",
+            CountedTTLCache(16_000_000, 30, getsizeof=MessageSnapshot.sizeof),
+        )
+        self.users = caches.register("cache.users", CountedTTLCache(5_000, 15))
+        # (guild_id, user_id) of members that weren't found
+        self.missing_members = caches.register(
+            "cache.missing_members", CountedTTLCache(10_000, 10)
+        )
+        # guild_id -> user_id -> future, waiting for _query_members
+        self.member_requests: Dict[int, Dict[int, asyncio.Future]] = {}
+        # guild_id -> how many _query_members are running for it
+        self.member_queries: Dict[int, int] = {}
         self.bot = bot
 
     async def fetch_user(self, user_id: int) -> discord.User:
@@ -66,42 +82,107 @@ class Cache:
         self, uids: List[int], guild: discord.Guild
     ) -> Dict[int, Optional[discord.Member]]:
         await self.bot.wait_until_ready()
-        not_found: List[int] = []
         result: Dict[int, Optional[discord.Member]] = {}
+        waiting: Dict[int, asyncio.Future] = {}
 
         for uid in uids:
             cached = guild.get_member(uid)
             if cached:
                 result[uid] = cached
-            else:
-                not_found.append(uid)
+            elif (guild.id, uid) not in self.missing_members:
+                waiting[uid] = self._request_member(guild, uid)
 
-        # only query 50 members at a time
-        for group in utils.chunk_list(not_found, 50):
-            query = await guild.query_members(limit=None, user_ids=group)
-            for r in query:
-                result[r.id] = r
+        for uid, future in waiting.items():
+            member = await asyncio.shield(future)
+            if member:
+                result[uid] = member
 
         return result
 
+    def _request_member(
+        self, guild: discord.Guild, uid: int
+    ) -> asyncio.Future:
+        pending = self.member_requests.get(guild.id)
+        if pending is None:
+            pending = self.member_requests[guild.id] = {}
+            asyncio.create_task(self._query_members(guild))
+
+        future = pending.get(uid)
+        if future is None:
+            future = pending[uid] = asyncio.get_event_loop().create_future()
+        return future
+
+    async def _query_members(self, guild: discord.Guild) -> None:
+        pending = self.member_requests[guild.id]
+        running = self.member_queries.get(guild.id, 0)
+        self.member_queries[guild.id] = running + 1
+        try:
+            # let the other lookups made right now join in. if the guild
+            # is already being queried it's busy, so also wait a moment
+            # longer so that more of them can share the same requests
+            await asyncio.sleep(0)
+            if running:
+                await asyncio.sleep(MEMBER_BATCH_WINDOW)
+            self.member_requests.pop(guild.id)
+
+            # only query 50 members at a time
+            for group in utils.chunk_list(list(pending.keys()), 50):
+                try:
+                    query = await guild.query_members(
+                        limit=None, user_ids=group
+                    )
+                except Exception as e:
+                    for uid in group:
+                        pending[uid].set_exception(e)
+                        # every waiter might have been cancelled already
+                        pending[uid].exception()
+                    continue
+
+                found = {m.id: m for m in query}
+                for uid in group:
+                    member = found.get(uid)
+                    if member is None:
+                        self.missing_members[(guild.id, uid)] = True
+                    pending[uid].set_result(member)
+        finally:
+            if self.member_requests.get(guild.id) is pending:
+                self.member_requests.pop(guild.id)
+            self.member_queries[guild.id] -= 1
+            if not self.member_queries[guild.id]:
+                del self.member_queries[guild.id]
+            # if this was cancelled, don't leave anyone waiting forever
+            for future in pending.values():
+                if not future.done():
+                    future.cancel()
+
     async def fetch_message(
         self, guild_id: int, channel_id: int, message_id: int
     ) -> Optional[discord.Message]:
+        channel = None
+        guild = self.bot.get_guild(guild_id)
+        if guild:
+            channel = guild.get_channel(channel_id)
+
         cached = self.messages.get(message_id, default=MISSING)
         if cached is not MISSING:
-            return cached
+            if cached is None or channel is None:
+                return None
+            return cached.to_message(channel)
 
         message = None
-        guild = self.bot.get_guild(guild_id)
-        if guild:
-            channel = guild.get_channel(channel_id)
+        snapshot = None
         if channel:
             try:
-                message = await channel.fetch_message(message_id)
+                data = await self.bot.http.get_message(channel.id, message_id)
             except discord.errors.NotFound:
                 pass
+            else:
+                snapshot = MessageSnapshot(data)
+                message = channel._state.create_message(
+                    channel=channel, data=data
+                )
 
-        self.messages[message_id] = message
+        self.messages[message_id] = snapshot
         return message
 
 
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import datetime
+import math
 import random
 
 import discord
@@ -10,11 +11,15 @@ from discord.ext.prettyhelp import bot_has_permissions
 from app import commands, converters, flags, menus
 from app.classes.bot import Bot
 from app.classes.context import MyContext
+from app.classes.keyset_pager import KeysetPager
 from app.cogs.starboard import starboard_funcs
 from app.i18n import t_
 
 from . import fun_funcs
 
+# moststarred shows this many as the total at most, followed by a +
+MOST_STARRED_COUNT_LIMIT = 1_000
+
 
 class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
     def __init__(self, bot: Bot) -> None:
@@ -30,42 +35,25 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
     )
     @commands.guild_only()
     async def guild_leaderboard(self, ctx: "MyContext") -> None:
-        leaderboard = await fun_funcs.get_guild_leaderboard(
-            self.bot, ctx.guild
-        )
-        p = commands.Paginator(max_size=500)
-
-        def build_string(u: dict) -> str:
-            def setlen(text: str, new_length: int) -> str:
-                length = len(text)
-                if new_length > length:
-                    return text + " " * (new_length - length)
-                else:
-                    return text[0 : new_length - 3] + "..."
-
-            return (
-                f"#{u['rank']}: {setlen(u['name'], 20)} "
-                f"Level: {u['level']:02} XP: {u['xp']:04}"
-            )
-
-        for _uid, u in leaderboard.items():
-            p.add_line(build_string(u))
-
-        if len(p.pages) == 0:
+        leaderboard = await self.bot.db.members.get_leaderboard(ctx.guild.id)
+        if len(leaderboard) == 0:
             await ctx.send("Nothing to show.")
             return
 
-        embeds = [
-            discord.Embed(
+        async def get_page(page: int) -> discord.Embed:
+            return discord.Embed(
                 title=t_("Leaderboard for {0}:").format(ctx.guild.name),
-                description=page,
+                description=await fun_funcs.get_leaderboard_page(
+                    self.bot, ctx.guild, leaderboard, page
+                ),
                 color=self.bot.theme_color,
             )
-            for page in p.pages
-        ]
 
         await menus.Paginator(
-            embed_pages=embeds,
+            get_page=get_page,
+            page_count=math.ceil(
+                len(leaderboard) / fun_funcs.LEADERBOARD_PAGE_SIZE
+            ),
             delete_after=True,
         ).start(ctx)
 
@@ -92,7 +80,11 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
         sql_member = await self.bot.db.members.get(user.id, ctx.guild.id)
 
         # Guild Stats
-        rank = await fun_funcs.get_rank(self.bot, ctx.guild, user.id)
+        rank = None
+        if sql_member and sql_member["xp"] > 0 and not sql_user["is_bot"]:
+            rank = await self.bot.db.members.get_rank(
+                ctx.guild.id, sql_member["xp"]
+            )
         if sql_member:
             stars_given = sql_member["stars_given"]
             stars_recv = sql_member["stars_received"]
@@ -181,34 +173,32 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
         if place < 0:
             raise commands.BadArgument(t_("--place must be greater than 0"))
 
-        messages = await self.bot.db.fetch(
-            """SELECT * FROM starboard_messages
-            WHERE ($6::numeric is NULL or id>$6)
-            AND ($7::numeric is NULL or id<$7)
-            AND starboard_id=any($1::numeric[])
-            AND ($2::numeric is NULL or starboard_id=$2::numeric)
-            AND EXISTS(
-                SELECT * FROM messages
-                WHERE id=orig_id
-                AND ($3::numeric is NULL or author_id=$3::numeric)
-                AND ($4::numeric is NULL or channel_id=$4::numeric)
-                AND trashed=False
+        if starboard_id is not None:
+            all_starboards = (
+                [starboard_id] if starboard_id in all_starboards else []
             )
-            AND ($5::smallint is NULL or points <= $5::smallint)
-            ORDER BY points DESC""",
+        filters = (
             all_starboards,
-            starboard_id,
             author_id,
             channel_id,
+            None,
             maxpoints,
             newer_than,
             older_than,
         )
 
+        async def fetch(limit: int, offset: int, after, before):
+            return await self.bot.db.sb_messages.get_most_starred(
+                filters, limit, offset, after, before
+            )
+
+        messages = KeysetPager(fetch)
+        total = None
+
         async def getter(page: int):
-            try:
-                m = messages[page]
-            except IndexError:
+            nonlocal total
+            m = await messages.get(page)
+            if m is None:
                 return None
             orig = await self.bot.db.messages.get(int(m["orig_id"]))
             obj = await self.bot.cache.fetch_message(
@@ -217,7 +207,7 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
                 int(orig["id"]),
             )
             if not obj:
-                del messages[page]
+                await messages.remove(page)
                 return await getter(page)
             sql_starboard = await self.bot.db.starboards.get(m["starboard_id"])
             color = sql_starboard["color"]
@@ -228,7 +218,14 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
                 nicknames=sql_starboard["nicknames"],
                 files=False,
             )
-            e.set_footer(text=t_("Page {0}").format(page + 1))
+            if total is None:
+                count = await self.bot.db.sb_messages.count_explorable(
+                    filters, MOST_STARRED_COUNT_LIMIT
+                )
+                total = (
+                    f"{count}+" if count >= MOST_STARRED_COUNT_LIMIT else count
+                )
+            e.set_footer(text=t_("Page {0} of {1}").format(page + 1, total))
             text = starboard_funcs.get_plain_text(
                 sql_starboard, orig, m["points"], ctx.guild
             )
@@ -289,36 +286,26 @@ class Fun(commands.Cog, description=t_("Fun commands for Starboard.", True)):
             date = datetime.datetime.utcnow() - arg
             return utils.time_snowflake(date)
 
-        good_messages = await self.bot.db.fetch(
-            """SELECT * FROM starboard_messages
-            WHERE starboard_id=any($1::numeric[])
-            AND ($7::numeric is NULL or id>$7)
-            AND ($8::numeric is NULL or id<$8)
-            AND ($2::numeric is NULL or starboard_id=$2::numeric)
-            AND ($3::smallint is NULL or points >= $3::smallint)
-            AND ($4::smallint is NULL or points <= $4::smallint)
-            AND EXISTS (
-                SELECT * FROM messages
-                WHERE id=orig_id
-                AND trashed=False
-                AND ($5::numeric is NULL or author_id=$5::numeric)
-                AND ($6::numeric is NULL or channel_id=$6::numeric)
-            )""",
-            all_starboards,
-            starboard_id,
-            options["minstars"],
-            options["maxstars"],
-            author_id,
-            channel_id,
-            td_or_none(options["newerthan"]),
-            td_or_none(options["olderthan"]),
+        if starboard_id is not None:
+            all_starboards = (
+                [starboard_id] if starboard_id in all_starboards else []
+            )
+        choice = await self.bot.db.sb_messages.get_random(
+            (
+                all_starboards,
+                author_id,
+                channel_id,
+                options["minstars"],
+                options["maxstars"],
+                td_or_none(options["newerthan"]),
+                td_or_none(options["olderthan"]),
+            )
         )
-        if len(good_messages) == 0:
+        if choice is None:
             await ctx.send(
                 t_("No messages were found that matched those requirements.")
             )
             return
-        choice = random.choice(good_messages)
         orig_sql_message = await self.bot.db.messages.get(choice["orig_id"])
         sql_starboard = await self.bot.db.starboards.get(
             choice["starboard_id"]
@@ -1,40 +1,36 @@
 import discord
 
 from app.classes.bot import Bot
+from app.classes.leaderboard import Leaderboard
 
+LEADERBOARD_PAGE_SIZE = 10
 
-async def get_guild_leaderboard(bot: Bot, guild: discord.Guild) -> dict:
-    leaderboard = {}
-    top_users = await bot.db.fetch(
-        """SELECT * FROM members
-        WHERE guild_id=$1
-        AND xp > 0
-        ORDER BY xp DESC
-        LIMIT 200""",
-        guild.id,
+
+def setlen(text: str, new_length: int) -> str:
+    length = len(text)
+    if new_length > length:
+        return text + " " * (new_length - length)
+    else:
+        return text[0 : new_length - 3] + "..."
+
+
+async def get_leaderboard_page(
+    bot: Bot, guild: discord.Guild, leaderboard: Leaderboard, page: int
+) -> str:
+    """Only the members on this page are looked up. Members that left
+    the guild keep their place, and are shown by their id."""
+
+    start = page * LEADERBOARD_PAGE_SIZE
+    entries = leaderboard.page(start, start + LEADERBOARD_PAGE_SIZE)
+    user_lookup = await bot.cache.get_members(
+        [user_id for _, user_id, _, _ in entries], guild
     )
-    uids = [int(u["user_id"]) for u in top_users]
-    user_lookup = await bot.cache.get_members(uids, guild)
-    current_rank = 0
-    for u in top_users:
-        obj = user_lookup.get(int(u["user_id"]))
-        if not obj:
-            continue
-        if obj.bot:
-            continue
-
-        current_rank += 1
-
-        leaderboard[obj.id] = {
-            "name": str(obj),
-            "xp": u["xp"],
-            "level": u["level"],
-            "rank": current_rank,
-        }
-    return leaderboard
-
-
-async def get_rank(bot: Bot, guild: discord.Guild, user_id: int) -> int:
-    lb = await get_guild_leaderboard(bot, guild)
-    u = lb.get(user_id)
-    return None if not u else u["rank"]
+
+    lines = []
+    for rank, user_id, xp, level in entries:
+        obj = user_lookup.get(user_id)
+        name = str(obj) if obj else str(user_id)
+        lines.append(
+            f"#{rank}: {setlen(name, 20)} Level: {level:02} XP: {xp:04}"
+        )
+    return "```\n" + "\n".join(lines) + "\n```"
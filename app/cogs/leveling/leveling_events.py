@@ -1,16 +1,82 @@
-from typing import Optional
+import asyncio
+from typing import Dict, List, Tuple
 
 from app import commands, cooldowns
 from app.classes.bot import Bot
+from app.classes.write_behind import WriteBehind
 from app.cogs.permroles import pr_functions
 
 from . import leveling_funcs
 
+# how long star and xp changes are added up before being written
+COUNTER_INTERVAL = 0.25
+
 
 class LevelingEvents(commands.Cog):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
         self.cooldown = cooldowns.FlexibleCooldownMapping()
+        # (user_id, guild_id) -> (stars given, stars received, xp)
+        self.counters = WriteBehind(
+            self.flush_counters, COUNTER_INTERVAL, bot.log
+        )
+        bot.write_behinds.append(self.counters)
+
+    def cog_unload(self) -> None:
+        self.bot.write_behinds.remove(self.counters)
+        asyncio.create_task(self.counters.close())
+
+    async def flush_counters(
+        self, changes: Dict[Tuple[int, int], Tuple[int, int, int]]
+    ) -> None:
+        # only this is retried if it fails. once it has committed,
+        # retrying the batch would add the same stars and xp again
+        rows = await self.bot.db.members.add_counters(changes)
+
+        gained_xp = []
+        levels: Dict[Tuple[int, int], int] = {}
+        for r in rows:
+            if not r["xp_added"]:
+                continue
+            key = (int(r["user_id"]), int(r["guild_id"]))
+            gained_xp.append(key)
+            new_level = leveling_funcs.current_level(r["xp"])
+            if new_level > r["level"]:
+                levels[key] = new_level
+
+        if levels:
+            try:
+                leveled_up = await self.bot.db.members.set_levels(levels)
+            except Exception:
+                self.bot.log.exception(f"Failed to set {len(levels)} levels")
+            else:
+                # so that the next batch doesn't wait for the gateway
+                asyncio.create_task(self.level_ups(leveled_up))
+
+        for user_id, guild_id in gained_xp:
+            self.bot.dispatch("update_xpr", guild_id, user_id)
+            self.bot.dispatch("update_pr", guild_id, user_id)
+
+    async def level_ups(self, rows: List[dict]) -> None:
+        for r in rows:
+            try:
+                await self.level_up(
+                    int(r["user_id"]), int(r["guild_id"]), r["level"]
+                )
+            except Exception:
+                self.bot.log.exception(
+                    f"Failed to announce a level up in {r['guild_id']}"
+                )
+
+    async def level_up(self, user_id: int, guild_id: int, level: int) -> None:
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        members = await self.bot.cache.get_members([user_id], guild)
+        if user_id not in members or members[user_id].bot:
+            return
+        await self.bot.set_locale(guild)
+        self.bot.dispatch("level_up", guild, members[user_id], level)
 
     @commands.Cog.listener()
     async def on_star_update(
@@ -56,77 +122,27 @@ class LevelingEvents(commands.Cog):
         else:
             gain_xp = True
 
-        await self.bot.db.members.create(giver_id, guild_id)
-        sql_giver = await self.bot.db.members.get(giver_id, guild_id)
-        await self.bot.db.members.create(receiver_id, guild_id)
+        async with self.bot.db.session():
+            await self.bot.db.members.create(giver_id, guild_id)
+            await self.bot.db.members.create(receiver_id, guild_id)
 
-        await self.bot.db.execute(
-            """UPDATE members SET stars_given = stars_given + $1
-            WHERE user_id=$2 AND guild_id=$3""",
-            points,
-            sql_giver["user_id"],
-            sql_giver["guild_id"],
-        )
+        xp = points if gain_xp else 0
+        if xp:
+            sql_guild = await self.bot.db.guilds.get(guild_id)
+            cooldown = sql_guild["xp_cooldown"]
+            per = sql_guild["xp_cooldown_per"]
 
-        await self.bot.db.execute(
-            """UPDATE members
-            SET stars_received = stars_received + $1
-            WHERE user_id=$2 AND guild_id=$3""",
-            points,
-            receiver_id,
-            guild_id,
-        )
-
-        if not gain_xp:
-            return
-
-        leveled_up: Optional[int] = None
-
-        sql_guild = await self.bot.db.guilds.get(guild_id)
-        cooldown, per = sql_guild["xp_cooldown"], sql_guild["xp_cooldown_per"]
-
-        if per != 0 and sql_guild["xp_cooldown_on"]:
-            bucket = self.cooldown.get_bucket(
-                (giver_id, receiver_id), cooldown, per
-            )
-            retry_after = bucket.update_rate_limit()
-            if retry_after:
-                return
-
-        async with self.bot.db.pool.acquire() as con:
-            await con.execute(
-                """UPDATE members
-                SET xp = xp + $1
-                WHERE user_id=$2 AND guild_id=$3""",
-                points,
-                receiver_id,
-                guild_id,
-            )
-            sql_receiver = await con.fetchrow(
-                """SELECT * FROM members WHERE user_id=$1
-                AND guild_id=$2 FOR UPDATE""",
-                receiver_id,
-                guild_id,
-            )
-            new_level = leveling_funcs.current_level(sql_receiver["xp"])
-            if new_level > sql_receiver["level"]:
-                leveled_up = new_level
-                await con.execute(
-                    """UPDATE members SET level=$1
-                    WHERE user_id=$2 AND guild_id=$3""",
-                    new_level,
-                    receiver_id,
-                    guild_id,
+            if per != 0 and sql_guild["xp_cooldown_on"]:
+                bucket = self.cooldown.get_bucket(
+                    (giver_id, receiver_id), cooldown, per
                 )
+                retry_after = bucket.update_rate_limit()
+                if retry_after:
+                    xp = 0
 
-        if leveled_up:
-            guild = self.bot.get_guild(guild_id)
-            await self.bot.set_locale(guild)
-            if not receiver.bot:
-                self.bot.dispatch("level_up", guild, receiver, leveled_up)
-
-        self.bot.dispatch("update_xpr", guild.id, receiver.id)
-        self.bot.dispatch("update_pr", guild.id, receiver.id)
+        # level ups are found once the changes have been written
+        self.counters.add((giver_id, guild_id), (points, 0, 0))
+        self.counters.add((receiver_id, guild_id), (0, points, xp))
 
 
 def setup(bot: Bot) -> None:
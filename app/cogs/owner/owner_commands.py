@@ -3,7 +3,7 @@ import textwrap
 import time
 import traceback
 from contextlib import redirect_stdout
-from typing import List
+from typing import Dict, List
 
 import discord
 from jishaku.cog import OPTIONAL_FEATURES, STANDARD_FEATURES
@@ -12,7 +12,10 @@ from jishaku.features.baseclass import Feature
 
 from app import checks, commands, menus, utils
 from app.classes.bot import Bot
+from app.classes.cache_registry import caches
 from app.classes.context import MyContext
+from app.classes.counter_registry import counters
+from app.classes.latency_histogram import StatementStats
 
 
 class Rollback(Exception):
@@ -149,43 +152,64 @@ class Owner(*OPTIONAL_FEATURES, *STANDARD_FEATURES):
     @commands.command(name="sqltimes")
     @checks.is_owner()
     async def get_sql_times(
-        self, ctx: "MyContext", sort_by: str = "total"
+        self, ctx: "MyContext", sort_by: str = "total", scope: str = "cluster"
     ) -> None:
         """Shows stats on SQL queries"""
-        if sort_by not in ["avg", "total", "exec"]:
-            await ctx.send("Valid optons are `avg`, `total`, and `exec`.")
+        sorters = {
+            "avg": lambda s: s.exec.avg,
+            "total": lambda s: s.exec.total,
+            "exec": lambda s: s.exec.count,
+            "p99": lambda s: s.exec.percentile(99),
+            "wait": lambda s: s.wait.total,
+            "rows": lambda s: s.rows,
+        }
+        if sort_by not in sorters:
+            await ctx.send(
+                "Valid options are "
+                + ", ".join(f"`{k}`" for k in sorters)
+                + "."
+            )
+            return
+        if scope not in ["cluster", "all"]:
+            await ctx.send("Valid options are `cluster` and `all`.")
             return
 
-        times = []
-        for sql in self.bot.db.sql_times:
-            total_time = 0
-            executions = 0
-            for exec_time in self.bot.db.sql_times[sql]:
-                executions += 1
-                total_time += exec_time
-            times.append(
-                (sql, (total_time / executions, total_time, executions))
+        stats: Dict[str, StatementStats] = {}
+        if scope == "all":
+            resps = await self.bot.websocket.send_command(
+                "sql_stats", {}, expect_resp=True
             )
-        pag = commands.Paginator(prefix="", suffix="", max_size=1000)
-        if len(times) == 0:
+            for r in resps:
+                for sql, data in r["data"].items():
+                    s = StatementStats.from_dict(data)
+                    if sql in stats:
+                        stats[sql].merge(s)
+                    else:
+                        stats[sql] = s
+        else:
+            stats = self.bot.db.sql_stats
+
+        if len(stats) == 0:
             await ctx.send("Nothing to show")
             return
 
-        def sorter(t):
-            if sort_by == "avg":
-                return t[1][0]
-            elif sort_by == "total":
-                return t[1][1]
-            elif sort_by == "exec":
-                return t[1][2]
-
-        times.sort(key=sorter, reverse=True)
-        for sql, exec_time in times:
+        pag = commands.Paginator(prefix="", suffix="", max_size=1000)
+        key = sorters[sort_by]
+        for sql, s in sorted(
+            stats.items(), key=lambda i: key(i[1]), reverse=True
+        ):
+            e, w = s.exec, s.wait
             pag.add_line(
                 f"```sql\n{sql}```"
-                f"{utils.ms(exec_time[0])} MS AVG | "
-                f"{round(exec_time[1], 2)} SECONDS TOTAL | "
-                f"{exec_time[2]} EXECUTIONS\n"
+                f"{utils.ms(e.avg)} MS AVG | "
+                f"{utils.ms(e.percentile(50))}/{utils.ms(e.percentile(95))}/"
+                f"{utils.ms(e.percentile(99))}/{utils.ms(e.max)} MS "
+                "P50/P95/P99/MAX\n"
+                f"{round(e.total, 2)} SECONDS TOTAL | "
+                f"{e.count} EXECUTIONS | {s.rows} ROWS\n"
+                f"{utils.ms(w.avg)} MS AVG WAIT | "
+                f"{utils.ms(w.percentile(99))} MS P99 WAIT | "
+                f"{round(w.total, 2)} SECONDS TOTAL WAIT\n"
             )
 
         await menus.Paginator(
@@ -193,6 +217,104 @@ class Owner(*OPTIONAL_FEATURES, *STANDARD_FEATURES):
             delete_after=True,
         ).start(ctx)
 
+    @commands.command(name="caches")
+    @checks.is_owner()
+    async def cache_stats(self, ctx: "MyContext", scope: str = "cluster"):
+        """Shows stats on every cache"""
+        if scope not in ["cluster", "all"]:
+            await ctx.send("Valid options are `cluster` and `all`.")
+            return
+
+        if scope == "all":
+            resps = await self.bot.websocket.send_command(
+                "cache_stats", {}, expect_resp=True
+            )
+            stats = caches.merge([r["data"] for r in resps])
+            header = f"Totals for {len(resps)} clusters"
+        else:
+            stats = caches.stats()
+            header = f"Cluster {self.bot.cluster_name}"
+
+        pag = commands.Paginator(prefix="```", suffix="```", max_size=1000)
+        pag.add_line(header)
+        for name, s in sorted(stats.items()):
+            pag.add_line(
+                f"\n{name}: {s['size']}/{s['maxsize'] or '-'} ITEMS | "
+                f"{s['ttl'] or '-'} TTL | "
+                f"{round(s['memory'] / 1024, 2)} KB"
+            )
+            if "hits" not in s:
+                continue
+            hits = s["hits"] + s.get("stale_hits", 0)
+            lookups = hits + s["misses"] + s.get("coalesced", 0)
+            ratio = round(hits / lookups * 100, 2) if lookups else 0
+            pag.add_line(
+                f"{ratio}% HITS | {s['hits']} HITS | "
+                f"{s.get('stale_hits', 0)} STALE | {s['misses']} MISSES | "
+                f"{s.get('coalesced', 0)} COALESCED | "
+                f"{s['evictions']} EVICTIONS"
+            )
+
+        await menus.Paginator(
+            text_pages=pag.pages,
+            delete_after=True,
+        ).start(ctx)
+
+    @commands.command(name="counters")
+    @checks.is_owner()
+    async def counter_stats(self, ctx: "MyContext", scope: str = "cluster"):
+        """Shows what queues and batchers have been doing"""
+        if scope not in ["cluster", "all"]:
+            await ctx.send("Valid options are `cluster` and `all`.")
+            return
+
+        if scope == "all":
+            resps = await self.bot.websocket.send_command(
+                "counter_stats", {}, expect_resp=True
+            )
+            stats = counters.merge([r["data"] for r in resps])
+            header = f"Totals for {len(resps)} clusters"
+        else:
+            stats = counters.stats()
+            header = f"Cluster {self.bot.cluster_name}"
+
+        pag = commands.Paginator(prefix="```", suffix="```", max_size=1000)
+        pag.add_line(header)
+        for name, values in sorted(stats.items()):
+            pag.add_line(
+                f"\n{name}: "
+                + " | ".join(f"{v} {k.upper()}" for k, v in values.items())
+            )
+
+        await menus.Paginator(
+            text_pages=pag.pages,
+            delete_after=True,
+        ).start(ctx)
+
+    @commands.command(name="knownmessages")
+    @checks.is_owner()
+    async def known_messages(self, ctx: "MyContext") -> None:
+        """Shows stats on the known message filter"""
+        messages = self.bot.db.messages
+        if not messages.known_ready:
+            await ctx.send("The filter is still being built.")
+            return
+
+        known = messages.known
+        skipped = 0
+        if messages.known_checks:
+            skipped = messages.known_skips / messages.known_checks * 100
+        await ctx.send(
+            f"```\n"
+            f"Items: {known.count}\n"
+            f"Memory: {round(known.memory / 1024, 2)} KB "
+            f"({known.size} bits, {known.hashes} hashes)\n"
+            f"False positive rate: {round(known.error_rate * 100, 4)}%\n"
+            f"Deletes checked: {messages.known_checks} "
+            f"({round(skipped, 2)}% skipped)\n"
+            f"```"
+        )
+
     @commands.command(name="reconnect")
     @checks.is_owner()
     async def reconnect_bot(self, ctx: "MyContext") -> None:
@@ -1,9 +1,8 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
 import discord
 
 from app.classes.bot import Bot
-from app.cogs.cache.cache import cached
 
 
 def pretty_permrole_string(
@@ -38,11 +37,6 @@ def pretty_perm_string(perms: Dict[str, bool]):
     return result
 
 
-@cached(
-    5_000,
-    30,
-    cache_args=[1, 2, 3, 4],
-)
 async def get_perms(
     bot: Bot,
     roles: List[int],
@@ -50,47 +44,28 @@ async def get_perms(
     channel_id: Optional[int],
     starboard_id: Optional[int],
 ) -> Dict[str, bool]:
-    groups = await bot.db.fetch(
-        """SELECT * FROM permgroups
-        WHERE guild_id=$1
-        AND (
-            channels='{}'
-            OR $2::numeric IS NULL
-            OR $2::numeric=any(channels)
-        )
-        AND (
-            starboards='{}'
-            OR $3::numeric IS NULL
-            OR $3::numeric=any(starboards)
-        )
-        """,
-        guild_id,
-        channel_id,
-        starboard_id,
-    )
+    matrix = await bot.db.permgroups.get_matrix(guild_id)
+    return matrix.resolve(roles, channel_id, starboard_id)
 
-    permroles = []
-    for g in groups:
-        permroles += await bot.db.fetch(
-            """SELECT * FROM permroles
-            WHERE permgroup_id=$1
-            AND role_id=any($2::numeric[])""",
-            g["id"],
-            roles,
-        )
 
-    perms = {
-        "allow_commands": True,
-        "on_starboard": True,
-        "give_stars": True,
-        "gain_xp": True,
-        "pos_roles": True,
-        "xp_roles": True,
-    }
-    for pr in permroles:
-        for key in perms.keys():
-            if pr[key] is None:
-                continue
-            perms[key] = pr[key]
+async def get_perms_many(
+    bot: Bot,
+    role_sets: List[Iterable[int]],
+    guild_id: int,
+    channel_id: Optional[int],
+    starboard_id: Optional[int],
+) -> List[Dict[str, bool]]:
+    """Same as calling get_perms for each set of roles. Members whose
+    roles don't differ in any way that matters here share the same
+    result."""
+    matrix = await bot.db.permgroups.get_matrix(guild_id)
 
-    return perms
+    merged: Dict[FrozenSet[int], Dict[str, bool]] = {}
+    result = []
+    for roles in role_sets:
+        key = matrix.roles.intersection(roles)
+        perms = merged.get(key)
+        if perms is None:
+            perms = merged[key] = matrix.resolve(key, channel_id, starboard_id)
+        result.append(perms)
+    return result
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import discord
 
@@ -130,15 +130,43 @@ async def extract_embeds(bot: "Bot", message: discord.Message, urls) -> str:
     return content
 
 
-async def extract_attachments(message: discord.Message, files: bool, urls):
+IMAGE_TYPES = ("png", "jpg", "jpeg", "gif", "gifv", "svg", "webp")
+
+
+def image_upload(message: discord.Message) -> Optional[discord.Attachment]:
+    """The upload that embed_message shows as the embed's image. Every
+    other upload is sent as a file instead."""
+    if message.channel.is_nsfw():
+        return None
+    for attachment in message.attachments:
+        if (
+            attachment.url.endswith(IMAGE_TYPES)
+            and not attachment.is_spoiler()
+        ):
+            return attachment
+    return None
+
+
+async def upload_files(message: discord.Message) -> List[discord.File]:
+    """Downloads the uploads that embed_message sends as files."""
+    nsfw = message.channel.is_nsfw()
+    shown = image_upload(message)
+    result: List[discord.File] = []
+    for attachment in message.attachments:
+        if attachment is shown:
+            continue
+        try:
+            f = await attachment.to_file()
+        except (discord.Forbidden, discord.HTTPException):
+            continue
+        if nsfw:
+            f.filename = "SPOILER_" + f.filename
+        result.append(f)
+    return result
+
+
+async def extract_attachments(message: discord.Message, urls):
     for attachment in message.attachments:
-        if files:
-            try:
-                f = await attachment.to_file()
-            except (discord.Forbidden, discord.HTTPException):
-                f = None
-        else:
-            f = None
         urls.append(
             {
                 "name": attachment.filename,
@@ -146,7 +174,7 @@ async def extract_attachments(message: discord.Message, files: bool, urls):
                 "url": attachment.url,
                 "type": "upload",
                 "spoiler": attachment.is_spoiler(),
-                "file": f,
+                "attachment": attachment,
                 "show_link": True,
                 "thumbnail_only": False,
             }
@@ -164,11 +192,10 @@ async def embed_message(
     content = utils.escmask(utils.escesc(message.system_content))
 
     urls = []
-    extra_attachments = []
     image_used = False
     thumbnail_used = False
 
-    await extract_attachments(message, files, urls)
+    await extract_attachments(message, urls)
     content += await extract_embeds(bot, message, urls)
     content = utils.truncate(content, MAX_EMBED_DESC_LENGTH)
 
@@ -178,33 +205,22 @@ async def embed_message(
     )
 
     embed = discord.Embed(
-        color=bot.theme_color
-        if color is None
-        else int(color.replace("#", ""), 16),
+        color=(
+            bot.theme_color
+            if color is None
+            else int(color.replace("#", ""), 16)
+        ),
         description=content,
     ).set_author(name=author_name, icon_url=message.author.avatar_url)
 
     await add_jump_links(bot, message, embed)
 
-    image_types = ["png", "jpg", "jpeg", "gif", "gifv", "svg", "webp"]
+    shown = image_upload(message)
     for data in urls:
         if data["type"] == "upload":
-            is_image = False
-            for t in image_types:
-                if data["url"].endswith(t):
-                    is_image = True
-                    break
-            added = False
-            if is_image and not nsfw and not data["spoiler"]:
-                if not image_used:
-                    embed.set_image(url=data["display_url"])
-                    image_used = True
-                    added = True
-            if not added and data["file"] is not None:
-                f: discord.File = data["file"]
-                if nsfw:
-                    f.filename = "SPOILER_" + f.filename
-                extra_attachments.append(f)
+            if data["attachment"] is shown:
+                embed.set_image(url=data["display_url"])
+                image_used = True
         elif not nsfw:
             if data["thumbnail_only"]:
                 if not thumbnail_used:
@@ -241,4 +257,5 @@ async def embed_message(
 
     embed.timestamp = message.created_at
 
+    extra_attachments = await upload_files(message) if files else []
     return embed, extra_attachments
@@ -32,12 +32,30 @@ class StarboardEvents(commands.Cog):
                 channel.guild,
             )
 
+    @commands.Cog.listener()
+    async def on_member_update(
+        self, before: discord.Member, after: discord.Member
+    ) -> None:
+        if before.roles != after.roles:
+            # their roles decide whether their stars count
+            self.bot.point_counters.forget_user(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.bot.point_counters.forget_user(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.bot.point_counters.forget_user(member.guild.id, member.id)
+
     @commands.Cog.listener()
     async def on_raw_message_delete(
         self, payload: discord.RawMessageDeleteEvent
     ) -> None:
         if payload.guild_id is None:
             return
+        if not self.bot.db.messages.maybe_known(payload.message_id):
+            return
         sb_message = await self.bot.db.sb_messages.get(payload.message_id)
         if sb_message:
             # Delete the starboard message
@@ -72,15 +90,20 @@ class StarboardEvents(commands.Cog):
 
         # Check if is starEmoji
         emoji = utils.clean_emoji(payload.emoji)
+        rules = await self.bot.db.starboards.get_rules(payload.guild_id)
+        if emoji not in rules.emojis:
+            return
 
-        # Create necessary data
-        await self.bot.db.users.create(payload.member.id, payload.member.bot)
-        await self.bot.db.members.create(payload.member.id, payload.guild_id)
+        async with self.bot.db.session():
+            # Create necessary data
+            await self.bot.db.members.create(
+                payload.member.id, payload.guild_id, payload.member.bot
+            )
 
-        # Get/create the message
-        sql_message = await starboard_funcs.orig_message(
-            self.bot, payload.message_id
-        )
+            # Get/create the message
+            sql_message = await starboard_funcs.orig_message(
+                self.bot, payload.message_id
+            )
         if sql_message:
             guild_id, channel_id, message_id = (
                 int(sql_message["guild_id"]),
@@ -115,23 +138,21 @@ class StarboardEvents(commands.Cog):
         else:
             author_roles = [r.id for r in _author[author_id].roles]
 
-        if not sql_message:
-            # Create message + needed data
-            await self.bot.db.users.create(
-                message.author.id, message.author.bot
-            )
-            await self.bot.db.members.create(
-                message.author.id, payload.guild_id
-            )
-            await self.bot.db.messages.create(
-                message.id,
-                message.guild.id,
-                message.channel.id,
-                message.author.id,
-                message.channel.is_nsfw(),
-            )
+        async with self.bot.db.session():
+            if not sql_message:
+                # Create message + needed data
+                await self.bot.db.members.create(
+                    message.author.id, payload.guild_id, message.author.bot
+                )
+                await self.bot.db.messages.create(
+                    message.id,
+                    message.guild.id,
+                    message.channel.id,
+                    message.author.id,
+                    message.channel.is_nsfw(),
+                )
 
-        sql_author = await self.bot.db.users.get(author_id)
+            sql_author = await self.bot.db.users.get(author_id)
 
         # Check if valid
         frozen = trashed = False
@@ -163,9 +184,18 @@ class StarboardEvents(commands.Cog):
             return
 
         # Create the reaction
-        await self.bot.db.reactions.create_reaction_user(
+        existed = await self.bot.db.reactions.create_reaction_user(
             emoji, message_id, payload.user_id
         )
+        if not existed:
+            await starboard_funcs.add_points(
+                self.bot,
+                emoji,
+                message_id,
+                channel_id,
+                author_id,
+                payload.member,
+            )
         await starboard_funcs.update_message(
             self.bot, message_id, payload.guild_id
         )
@@ -187,29 +217,31 @@ class StarboardEvents(commands.Cog):
             return
         emoji = utils.clean_emoji(payload.emoji)
 
-        sb_emojis = []
-        starboards = await self.bot.db.starboards.get_many(payload.guild_id)
-        for s in starboards:
-            sb_emojis += s["star_emojis"]
-        if emoji not in sb_emojis:
+        rules = await self.bot.db.starboards.get_rules(payload.guild_id)
+        if emoji not in rules.emojis:
             return
 
-        orig_message = await starboard_funcs.orig_message(
-            self.bot, payload.message_id
-        )
-        if orig_message is None:
-            return
+        async with self.bot.db.session():
+            orig_message = await starboard_funcs.orig_message(
+                self.bot, payload.message_id
+            )
+            if orig_message is None:
+                return
 
-        if orig_message["frozen"] or orig_message["trashed"]:
-            return
+            if orig_message["frozen"] or orig_message["trashed"]:
+                return
 
-        r_user = await self.bot.db.reactions.get_reaction_user(
-            emoji, int(orig_message["id"]), payload.user_id
-        )
-        if not r_user:
+            deleted = await self.bot.db.reactions.delete_reaction_user(
+                emoji, int(orig_message["id"]), payload.user_id
+            )
+        if not deleted:
             return
-        await self.bot.db.reactions.delete_reaction_user(
-            emoji, int(orig_message["id"]), payload.user_id
+        await starboard_funcs.remove_points(
+            self.bot,
+            emoji,
+            int(orig_message["id"]),
+            payload.guild_id,
+            payload.user_id,
         )
         await starboard_funcs.update_message(
             self.bot, orig_message["id"], payload.guild_id
@@ -1,5 +1,9 @@
 import asyncio
-from typing import Any, Dict, List, Optional, Tuple
+import functools
+import hashlib
+import io
+import json
+from typing import Dict, List, Optional, Set, Tuple
 
 import discord
 
@@ -8,7 +12,7 @@ from app.classes.bot import Bot
 from app.cogs.permroles import pr_functions
 from app.i18n import t_
 
-from .embed_logic import embed_message
+from .embed_logic import embed_message, upload_files
 
 
 async def can_add(
@@ -34,23 +38,9 @@ async def can_add(
         return False, False  # Completely ignore bot reactions
 
     # First check if the emoji is a starEmoji on any of the starboards
-    _starboards = await bot.db.fetch(
-        """SELECT * FROM starboards
-        WHERE guild_id=$1
-        AND $2=any(star_emojis)
-        AND locked=False""",
-        guild_id,
-        emoji,
-    )
-    starboards: List[Dict[Any, Any]] = []
-    for s in _starboards:
-        if s["channel_wl"]:
-            if channel_id not in [int(cid) for cid in s["channel_wl"]]:
-                continue
-        elif s["channel_bl"]:
-            if channel_id in [int(cid) for cid in s["channel_bl"]]:
-                continue
-        starboards.append(s)
+    # that watch this channel
+    rules = await bot.db.starboards.get_rules(guild_id)
+    starboards = rules.candidates(emoji, channel_id)
     if len(starboards) == 0:
         return False, False
 
@@ -64,60 +54,36 @@ async def can_add(
     # starboards that use this emoji. If any of the starboards consider
     # it valid, then it cannot be automatically removed or ignored.
 
-    # Start by assuming invalid
-    valid = False
-    remove = True
+    # The compiled rules handle everything except permissions, so
+    # permissions are only checked for starboards that passed those.
+    starboards, remove = rules.check(
+        starboards,
+        member.id,
+        int(sql_author["id"]),
+        sql_author["is_bot"],
+        frozen,
+        trashed,
+    )
 
-    current_valid: Optional[bool] = None
+    giver_roles = [r.id for r in member.roles]
     for s in starboards:
-        if not s["remove_invalid"]:
-            remove = False
-        if current_valid is not None:
-            if current_valid:
-                valid = True
-                break
-
-        current_valid = True
-
-        # Check frozen/trashed
-        if frozen or trashed:
-            current_valid = False
-            continue
-
-        # Check selfStar
-        if not s["self_star"] and member.id == int(sql_author["id"]):
-            current_valid = False
-            continue
-
-        # Check bots
-        if (not s["allow_bots"]) and sql_author["is_bot"]:
-            current_valid = False
-            continue
-
         # Check the perms of the star giver
         giver_perms = await pr_functions.get_perms(
-            bot,
-            [r.id for r in member.roles],
-            guild_id,
-            channel_id,
-            int(s["id"]),
+            bot, giver_roles, guild_id, channel_id, s.id
         )
         if not giver_perms["give_stars"]:
-            current_valid = False
             continue
 
         # Check the perms of the star receiver
         recv_perms = await pr_functions.get_perms(
-            bot, author_roles, guild_id, channel_id, int(s["id"])
+            bot, author_roles, guild_id, channel_id, s.id
         )
         if not recv_perms["on_starboard"]:
-            current_valid = False
             continue
 
-    if current_valid:
-        valid = True
+        return True, False
 
-    return valid, (not valid) and remove
+    return False, remove
 
 
 def get_plain_text(
@@ -135,6 +101,51 @@ def get_plain_text(
     )
 
 
+def render_hash(content: str, embed: Optional[discord.Embed] = None) -> str:
+    """A fingerprint of what a starboard message was edited to."""
+    data = json.dumps(
+        [content, embed.to_dict() if embed else None],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def edit_starboard_message(
+    bot: Bot,
+    starboard_message: discord.Message,
+    webhook: Optional[discord.Webhook],
+    last_render: Optional[str],
+    content: str,
+    embed: Optional[discord.Embed] = None,
+) -> None:
+    """Queues an edit for a starboard message, unless it already shows
+    exactly this content by the time the edit runs."""
+    new_render = render_hash(content, embed)
+    kwargs = {"content": content}
+    if embed is not None:
+        kwargs["embed"] = embed
+
+    async def edit() -> None:
+        current = bot.db.sb_messages.get_render_hash(
+            starboard_message.id, last_render
+        )
+        if new_render == current:
+            return
+        try:
+            if starboard_message.author.id == bot.user.id:
+                await starboard_message.edit(**kwargs)
+            elif webhook and starboard_message.author.id == webhook.id:
+                await webhook.edit_message(starboard_message.id, **kwargs)
+            else:
+                return
+        except discord.errors.NotFound:
+            return
+        bot.db.sb_messages.edited_to(starboard_message.id, new_render)
+
+    bot.outbound.edit(starboard_message.channel.id, starboard_message.id, edit)
+
+
 async def get_or_set_webhook(
     bot: Bot, starboard: discord.TextChannel
 ) -> Optional[discord.Webhook]:
@@ -170,14 +181,80 @@ async def orig_message(bot: Bot, message_id: int) -> Optional[dict]:
     return await bot.db.messages.get(message_id)
 
 
+class UpdateContext:
+    """The parts of an update that are the same for every starboard.
+
+    Resolved once per update and shared by all handle_starboard tasks,
+    so that the original message, its author and its attachments are
+    only fetched once no matter how many starboards a guild has."""
+
+    def __init__(self, bot: Bot, sql_message: dict, guild: discord.Guild):
+        self.bot = bot
+        self.sql_message = sql_message
+        self.guild = guild
+
+        self.message: Optional[discord.Message] = None
+        self.forbidden = False
+        self.author_roles: List[int] = []
+
+        self._embeds: Dict[Tuple[Optional[str], bool], asyncio.Task] = {}
+        self._files: Optional[asyncio.Task] = None
+
+    async def resolve(self) -> None:
+        try:
+            self.message = await self.bot.cache.fetch_message(
+                int(self.sql_message["guild_id"]),
+                int(self.sql_message["channel_id"]),
+                int(self.sql_message["id"]),
+            )
+        except discord.Forbidden:
+            self.forbidden = True
+
+        author_id = int(self.sql_message["author_id"])
+        _author = await self.bot.cache.get_members([author_id], self.guild)
+        if _author:
+            self.author_roles = [r.id for r in _author[author_id].roles]
+
+    async def render(
+        self, color: Optional[str], nicknames: bool, files: bool = True
+    ) -> Tuple[discord.Embed, List[discord.File]]:
+        key = (color, nicknames)
+        if key not in self._embeds:
+            self._embeds[key] = asyncio.create_task(
+                embed_message(
+                    self.bot,
+                    self.message,
+                    color=color,
+                    nicknames=nicknames,
+                    files=False,
+                )
+            )
+        embed, _ = await self._embeds[key]
+        if not files:
+            return embed, []
+
+        # discord.File objects can only be sent once, so keep the
+        # downloaded data and build new ones for every send.
+        if self._files is None:
+            self._files = asyncio.create_task(self._download_files())
+        return embed, [
+            discord.File(io.BytesIO(data), filename=filename)
+            for filename, data in await self._files
+        ]
+
+    async def _download_files(self) -> List[Tuple[str, bytes]]:
+        attachments = await upload_files(self.message)
+        result: List[Tuple[str, bytes]] = []
+        for f in attachments:
+            result.append((f.filename, f.fp.read()))
+            f.close()
+        return result
+
+
 async def update_message(bot: Bot, message_id: int, guild_id: int) -> None:
-    if message_id in bot.update_message_lock:
-        return
-    bot.update_message_lock.add(message_id)
-    try:
-        await _update_message(bot, message_id, guild_id)
-    finally:
-        bot.update_message_lock.remove(message_id)
+    await bot.update_message_coalescer.run(
+        message_id, _update_message, bot, message_id, guild_id
+    )
 
 
 async def _update_message(bot: Bot, message_id: int, guild_id: int) -> None:
@@ -192,12 +269,16 @@ async def _update_message(bot: Bot, message_id: int, guild_id: int) -> None:
     sql_author = await bot.db.users.get(sql_message["author_id"])
     all_tasks = []
     if not sql_message["trashed"]:
+        ctx = UpdateContext(bot, sql_message, guild)
+        await ctx.resolve()
         for s in sql_starboards:
             if s["locked"]:
                 continue
             all_tasks.append(
                 asyncio.create_task(
-                    handle_starboard(bot, s, sql_message, sql_author, guild)
+                    handle_starboard(
+                        bot, s, sql_message, sql_author, guild, ctx
+                    )
                 )
             )
         for t in all_tasks:
@@ -210,55 +291,116 @@ async def _update_message(bot: Bot, message_id: int, guild_id: int) -> None:
 
 
 async def set_points(bot: Bot, points: int, message_id: int) -> None:
-    await bot.db.execute(
-        """UPDATE starboard_messages
-        SET points=$1 WHERE id=$2""",
-        points,
-        message_id,
-    )
+    await bot.db.sb_messages.set_points(message_id, points)
 
 
 async def calculate_points(
     bot: Bot, message: dict, starboard: dict, guild: discord.Guild
 ) -> int:
-    _reactions = await bot.db.fetch(
-        """SELECT * FROM reactions
-        WHERE message_id=$1
-        AND emoji=any($2::TEXT[])""",
-        message["id"],
-        starboard["star_emojis"],
+    message_id, starboard_id = int(message["id"]), int(starboard["id"])
+    signature = (
+        tuple(starboard["star_emojis"] or ()),
+        starboard["self_star"],
+        # any permission edit means everyone has to be checked again
+        bot.db.permgroups.generation(guild.id),
     )
 
+    points = bot.point_counters.get(message_id, starboard_id, signature)
+    if points is not None:
+        return points
+
+    journal = bot.point_counters.start_build(
+        guild.id, message_id, starboard_id
+    )
+    try:
+        counter, ignored = await count_points(bot, message, starboard, guild)
+    except BaseException:
+        if journal is not None:
+            bot.point_counters.cancel_build(message_id, starboard_id, journal)
+        raise
+
+    if journal is None:
+        return len(counter)
+    return bot.point_counters.finish_build(
+        message_id, starboard_id, signature, counter, ignored, journal
+    )
+
+
+async def count_points(
+    bot: Bot, message: dict, starboard: dict, guild: discord.Guild
+) -> Tuple[Dict[int, Set[str]], Set[int]]:
+    """Counts the points of a message from scratch. Returns the emojis
+    each valid user reacted with, and the users that weren't valid."""
+
+    _reactions = await bot.db.reactions.get_reactions(
+        message["id"], starboard["star_emojis"]
+    )
+    emojis = {r["id"]: r["emoji"] for r in _reactions}
+
     if starboard["self_star"] is False:
         uid = message["author_id"]
     else:
         uid = None
 
-    _reactions = await bot.db.fetch(
-        """SELECT * FROM reaction_users
-        WHERE reaction_id=any($1::INT[])
-        AND ($2::numeric IS NULL OR $2::numeric!=user_id)""",
-        [r["id"] for r in _reactions],
-        uid,
+    _reactions = await bot.db.reactions.get_reaction_users(
+        list(emojis.keys()), uid
     )
-    users = list(set(int(r["user_id"]) for r in _reactions))
-    user_objs = await bot.cache.get_members(users, guild)
-    valid = 0
-    for uid in users:
-        obj = user_objs.get(uid, None)
-        if not obj:
+    users: Dict[int, Set[str]] = {}
+    for r in _reactions:
+        users.setdefault(int(r["user_id"]), set()).add(
+            emojis[r["reaction_id"]]
+        )
+
+    user_objs = await bot.cache.get_members(list(users.keys()), guild)
+    members = [user_objs[uid] for uid in users if user_objs.get(uid)]
+    all_perms = await pr_functions.get_perms_many(
+        bot,
+        [[r.id for r in m.roles] for m in members],
+        guild.id,
+        message["channel_id"],
+        starboard["id"],
+    )
+    valid: Dict[int, Set[str]] = {}
+    for member, perms in zip(members, all_perms):
+        if not perms["give_stars"]:
+            continue
+        valid[member.id] = users[member.id]
+    return valid, set(users) - set(valid)
+
+
+async def add_points(
+    bot: Bot,
+    emoji: str,
+    message_id: int,
+    channel_id: int,
+    author_id: int,
+    member: discord.Member,
+) -> None:
+    """Updates the point counters of a message after a reaction was
+    added, the same way count_points would count it."""
+
+    rules = await bot.db.starboards.get_rules(member.guild.id)
+    roles = [r.id for r in member.roles]
+    for s in rules.emojis.get(emoji, ()):
+        if not bot.point_counters.tracking(message_id, s.id):
+            continue
+        if not s.self_star and member.id == author_id:
             continue
         perms = await pr_functions.get_perms(
-            bot,
-            [r.id for r in obj.roles],
-            guild.id,
-            message["channel_id"],
-            starboard["id"],
+            bot, roles, member.guild.id, channel_id, s.id
         )
         if not perms["give_stars"]:
+            bot.point_counters.ignore(message_id, s.id, member.id)
             continue
-        valid += 1
-    return valid
+        bot.point_counters.add(message_id, s.id, member.id, emoji)
+
+
+async def remove_points(
+    bot: Bot, emoji: str, message_id: int, guild_id: int, user_id: int
+) -> None:
+    rules = await bot.db.starboards.get_rules(guild_id)
+    for s in rules.emojis.get(emoji, ()):
+        bot.point_counters.remove(message_id, s.id, user_id, emoji)
 
 
 async def handle_trashed_message(
@@ -268,11 +410,8 @@ async def handle_trashed_message(
     if sql_starboard["webhook_url"]:
         webhook = await bot.get_webhook(sql_starboard["webhook_url"])
 
-    sql_starboard_message = await bot.db.fetchrow(
-        """SELECT * FROM starboard_messages
-        WHERE orig_id=$1 AND starboard_id=$2""",
-        sql_message["id"],
-        sql_starboard["id"],
+    sql_starboard_message = await bot.db.sb_messages.get_by_orig(
+        sql_message["id"], sql_starboard["id"]
     )
     if not sql_starboard_message:
         return
@@ -294,13 +433,21 @@ async def handle_trashed_message(
             utils.escmd(sql_message["trash_reason"]),
         ),
     )
-    try:
-        if starboard_message.author.id == bot.user.id:
-            await starboard_message.edit(embed=embed)
-        elif webhook and starboard_message.author.id == webhook.id:
-            await webhook.edit_message(starboard_message.id, embed=embed)
-    except discord.errors.NotFound:
-        pass
+
+    async def edit() -> None:
+        try:
+            if starboard_message.author.id == bot.user.id:
+                await starboard_message.edit(embed=embed)
+            elif webhook and starboard_message.author.id == webhook.id:
+                await webhook.edit_message(starboard_message.id, embed=embed)
+        except discord.errors.NotFound:
+            pass
+        else:
+            await bot.db.sb_messages.set_render_hash(
+                starboard_message.id, None
+            )
+
+    bot.outbound.edit(starboard_message.channel.id, starboard_message.id, edit)
 
 
 async def try_regex(
@@ -334,6 +481,7 @@ async def handle_starboard(
     sql_message: dict,
     sql_author: dict,
     guild: discord.Guild,
+    ctx: UpdateContext,
 ) -> None:
     starboard: discord.TextChannel = guild.get_channel(
         int(sql_starboard["id"])
@@ -345,11 +493,8 @@ async def handle_starboard(
     elif sql_starboard["webhook_url"]:
         webhook = await bot.get_webhook(sql_starboard["webhook_url"])
 
-    sql_starboard_message = await bot.db.fetchrow(
-        """SELECT * FROM starboard_messages
-        WHERE orig_id=$1 AND starboard_id=$2""",
-        sql_message["id"],
-        sql_starboard["id"],
+    sql_starboard_message = await bot.db.sb_messages.get_by_orig(
+        sql_message["id"], sql_starboard["id"]
     )
     if not sql_message["frozen"] or sql_starboard_message is None:
         points = await calculate_points(bot, sql_message, sql_starboard, guild)
@@ -358,31 +503,21 @@ async def handle_starboard(
     if sql_starboard_message is not None:
         await set_points(bot, points, sql_starboard_message["id"])
 
-    try:
-        message = await bot.cache.fetch_message(
-            int(sql_message["guild_id"]),
-            int(sql_message["channel_id"]),
-            int(sql_message["id"]),
-        )
-    except discord.Forbidden:
+    if ctx.forbidden:
         return
+    message = ctx.message
 
     blacklisted = sql_message["channel_id"] in sql_starboard["channel_bl"]
     whitelisted = sql_message["channel_id"] in sql_starboard["channel_wl"]
     if whitelisted:
         blacklisted = False
 
-    _author = await bot.cache.get_members(
-        [int(sql_message["author_id"])], guild
-    )
-    if _author:
-        author = _author[int(sql_message["author_id"])]
-        roles = [r.id for r in author.roles]
-    else:
-        roles = []
-
     user_perms = await pr_functions.get_perms(
-        bot, roles, guild.id, sql_message["channel_id"], starboard.id
+        bot,
+        ctx.author_roles,
+        guild.id,
+        sql_message["channel_id"],
+        starboard.id,
     )
 
     add = False
@@ -435,7 +570,9 @@ async def handle_starboard(
         add = True
         delete = False
 
+    last_render: Optional[str] = None
     if sql_starboard_message is not None:
+        last_render = sql_starboard_message["render_hash"]
         starboard_message = await bot.cache.fetch_message(
             int(sql_message["guild_id"]),
             int(sql_starboard_message["starboard_id"]),
@@ -459,40 +596,52 @@ async def handle_starboard(
         plain_text = get_plain_text(sql_starboard, sql_message, points, guild)
 
         if starboard_message is None and add and message:
-            embed, attachments = await embed_message(
-                bot,
-                message,
-                color=sql_starboard["color"],
-                nicknames=sql_starboard["nicknames"],
+            embed, attachments = await ctx.render(
+                sql_starboard["color"], sql_starboard["nicknames"]
             )
             # starboard = guild.get_channel(int(sql_starboard["id"]))
             try:
                 if not webhook or not sql_starboard["use_webhook"]:
-                    m = await starboard.send(
-                        plain_text,
-                        embed=embed,
-                        files=attachments,
-                        allowed_mentions=discord.AllowedMentions(users=True),
-                    )
-                else:
-                    try:
-                        m = await webhook.send(
-                            content=plain_text,
+                    m = await bot.outbound.send(
+                        starboard.id,
+                        functools.partial(
+                            starboard.send,
+                            plain_text,
                             embed=embed,
                             files=attachments,
                             allowed_mentions=discord.AllowedMentions(
                                 users=True
                             ),
-                            wait=True,
-                            username=sql_starboard["webhook_name"]
-                            or guild.me.display_name,
-                            avatar_url=sql_starboard["webhook_avatar"]
-                            or bot.user.avatar_url,
+                        ),
+                    )
+                else:
+                    try:
+                        m = await bot.outbound.send(
+                            starboard.id,
+                            functools.partial(
+                                webhook.send,
+                                content=plain_text,
+                                embed=embed,
+                                files=attachments,
+                                allowed_mentions=discord.AllowedMentions(
+                                    users=True
+                                ),
+                                wait=True,
+                                username=sql_starboard["webhook_name"]
+                                or guild.me.display_name,
+                                avatar_url=sql_starboard["webhook_avatar"]
+                                or bot.user.avatar_url,
+                            ),
                         )
                     except discord.NotFound:
                         await bot.db.starboards.set_webhook(starboard.id, None)
                         return await handle_starboard(
-                            bot, sql_starboard, sql_message, sql_author, guild
+                            bot,
+                            sql_starboard,
+                            sql_message,
+                            sql_author,
+                            guild,
+                            ctx,
                         )
             except discord.Forbidden:
                 async with bot.temp_locale(guild):
@@ -511,7 +660,15 @@ async def handle_starboard(
             await bot.db.sb_messages.create(
                 m.id, message.id, sql_starboard["id"]
             )
-            await set_points(bot, points, m.id)
+            # hashed the same way edits are, which only include the
+            # embed if the starboard links edits
+            await bot.db.sb_messages.set_points(
+                m.id,
+                points,
+                render_hash(
+                    plain_text, embed if sql_starboard["link_edits"] else None
+                ),
+            )
             if sql_starboard["autoreact"] is True:
                 for emoji in sql_starboard["star_emojis"]:
                     try:
@@ -539,41 +696,18 @@ async def handle_starboard(
                                 guild,
                             )
         elif starboard_message is not None and message:
-            try:
-                if edit:
-                    embed, _ = await embed_message(
-                        bot,
-                        message,
-                        color=sql_starboard["color"],
-                        files=False,
-                        nicknames=sql_starboard["nicknames"],
-                    )
-                    if starboard_message.author.id == bot.user.id:
-                        await starboard_message.edit(
-                            content=plain_text, embed=embed
-                        )
-                    elif webhook and starboard_message.author.id == webhook.id:
-                        await webhook.edit_message(
-                            starboard_message.id,
-                            content=plain_text,
-                            embed=embed,
-                        )
-                else:
-                    if starboard_message.author.id == bot.user.id:
-                        await starboard_message.edit(content=plain_text)
-                    elif webhook and starboard_message.author.id == webhook.id:
-                        await webhook.edit_message(
-                            starboard_message.id, content=plain_text
-                        )
-            except discord.errors.NotFound:
-                pass
+            if edit:
+                embed, _ = await ctx.render(
+                    sql_starboard["color"],
+                    sql_starboard["nicknames"],
+                    files=False,
+                )
+            else:
+                embed = None
+            edit_starboard_message(
+                bot, starboard_message, webhook, last_render, plain_text, embed
+            )
         elif starboard_message is not None:
-            try:
-                if starboard_message.author.id == bot.user.id:
-                    await starboard_message.edit(content=plain_text)
-                elif webhook and starboard_message.author.id == webhook.id:
-                    await webhook.edit_message(
-                        starboard_message.id, content=plain_text
-                    )
-            except discord.errors.NotFound:
-                pass
+            edit_starboard_message(
+                bot, starboard_message, webhook, last_render, plain_text
+            )
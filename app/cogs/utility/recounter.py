@@ -34,12 +34,13 @@ async def recount_reactions(
         async for user in reaction.users():
             if user.bot:
                 continue
-            await bot.db.users.create(user.id, user.bot)
-            await bot.db.members.create(user.id, message.guild.id)
+            await bot.db.members.create(user.id, message.guild.id, user.bot)
             await bot.db.reactions.create_reaction_user(
                 clean, message.id, user.id
             )
 
+    # the counters may have missed reactions, so count from scratch
+    bot.point_counters.forget(message.id)
     await starboard_funcs.update_message(bot, message.id, message.guild.id)
 
 
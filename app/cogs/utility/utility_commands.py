@@ -99,13 +99,7 @@ class Utility(
         if not await menus.Confirm(t_("Reset the leaderboard?")).start(ctx):
             await ctx.send(t_("Cancelled."))
             return
-        await self.bot.db.execute(
-            """UPDATE members
-            SET xp=0,
-            level=0
-            WHERE guild_id=$1""",
-            ctx.guild.id,
-        )
+        await self.bot.db.members.reset_xp(ctx.guild.id)
         await ctx.send(t_("Reset the leaderboard."))
 
     @commands.command(name="setxp", help=t_("Sets the XP for a user.", True))
@@ -127,17 +121,7 @@ class Utility(
             )
 
         new_level = leveling_funcs.current_level(xp)
-        await self.bot.db.execute(
-            """UPDATE members
-            SET xp=$1,
-            level=$2
-            WHERE user_id=$3
-            AND guild_id=$4""",
-            xp,
-            new_level,
-            user.id,
-            ctx.guild.id,
-        )
+        await self.bot.db.members.set_xp(user.id, ctx.guild.id, xp, new_level)
 
         await ctx.send(
             t_(
@@ -658,11 +642,8 @@ class Utility(
             s_obj = ctx.guild.get_channel(int(s["id"]))
             if not s_obj:
                 continue
-            sb_message = await self.bot.db.fetchrow(
-                """SELECT * FROM starboard_messages
-                WHERE orig_id=$1 AND starboard_id=$2""",
-                orig["id"],
-                s["id"],
+            sb_message = await self.bot.db.sb_messages.get_by_orig(
+                orig["id"], s["id"]
             )
             if not sb_message:
                 jump = t_("Not On Starboard")
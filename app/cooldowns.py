@@ -1,5 +1,7 @@
+import heapq
+import itertools
 import time
-from typing import Dict
+from typing import Any, Dict, List, Tuple
 
 
 class Cooldown:
@@ -67,21 +69,34 @@ class Cooldown:
         )
 
 
-class FlexibleCooldownMapping:
-    """Same as CooldownMapping, but each key can have
-    a different rate/per setting"""
+class _BucketCache:
+    """Buckets by key, each deleted once it hasn't been used for a
+    whole cooldown window.
+
+    Instead of scanning every bucket, each one has an entry in a heap,
+    ordered by when it would expire as of when the entry was pushed.
+    Entries are only checked once that time has passed, and a bucket
+    that was used since is pushed again with its new expiry, so each
+    call only touches the buckets that might actually be expiring."""
 
     def __init__(self):
-        self._cache: Dict[str, "Cooldown"] = {}
+        self._cache: Dict[Any, "Cooldown"] = {}
+        # (expiry, tie breaker, key, bucket)
+        self._expiry: List[Tuple[float, int, Any, "Cooldown"]] = []
+        self._counter = itertools.count()
 
-    def copy(self):
-        ret = FlexibleCooldownMapping()
+    def _copy_to(self, ret: "_BucketCache") -> None:
         ret._cache = self._cache.copy()
-        return ret
-
-    @staticmethod
-    def _bucket_key(cooldown_key):
-        return cooldown_key
+        ret._expiry = self._expiry.copy()
+        # (so that tie breakers stay unique between the two)
+        ret._counter = self._counter
+
+    def _add_bucket(self, key, bucket: "Cooldown") -> None:
+        self._cache[key] = bucket
+        heapq.heappush(
+            self._expiry,
+            (bucket._last + bucket.per, next(self._counter), key, bucket),
+        )
 
     def _verify_cache_integrity(self, current=None):
         # we want to delete all cache objects that haven't been used
@@ -89,18 +104,45 @@ class FlexibleCooldownMapping:
         # cooldown of 60s and it has not been used in 60s then that
         # key should be deleted
         current = current or time.time()
-        dead_keys = [
-            k for k, v in self._cache.items() if current > v._last + v.per
-        ]
-        for k in dead_keys:
-            del self._cache[k]
+        expiry = self._expiry
+        while expiry and current > expiry[0][0]:
+            _, _, key, bucket = heapq.heappop(expiry)
+            if self._cache.get(key) is not bucket:
+                # the bucket was already replaced
+                continue
+            if current > bucket._last + bucket.per:
+                del self._cache[key]
+            else:
+                heapq.heappush(
+                    expiry,
+                    (
+                        bucket._last + bucket.per,
+                        next(self._counter),
+                        key,
+                        bucket,
+                    ),
+                )
+
+
+class FlexibleCooldownMapping(_BucketCache):
+    """Same as CooldownMapping, but each key can have
+    a different rate/per setting"""
+
+    def copy(self):
+        ret = FlexibleCooldownMapping()
+        self._copy_to(ret)
+        return ret
+
+    @staticmethod
+    def _bucket_key(cooldown_key):
+        return cooldown_key
 
     def get_bucket(self, cooldown_key, rate, per, current=None) -> Cooldown:
         self._verify_cache_integrity(current)
         key = self._bucket_key(cooldown_key)
         if key not in self._cache:
             bucket = Cooldown(rate, per)
-            self._cache[key] = bucket
+            self._add_bucket(key, bucket)
         else:
             bucket = self._cache[key]
 
@@ -111,14 +153,14 @@ class FlexibleCooldownMapping:
         return bucket.update_rate_limit(current)
 
 
-class CooldownMapping:
+class CooldownMapping(_BucketCache):
     def __init__(self, original: "Cooldown"):
-        self._cache = {}
+        super().__init__()
         self._cooldown = original
 
     def copy(self):
         ret = CooldownMapping(self._cooldown)
-        ret._cache = self._cache.copy()
+        self._copy_to(ret)
         return ret
 
     @property
@@ -133,24 +175,12 @@ class CooldownMapping:
     def _bucket_key(cooldown_key):
         return cooldown_key
 
-    def _verify_cache_integrity(self, current=None):
-        # we want to delete all cache objects that haven't been used
-        # in a cooldown window. e.g. if we have a  command that has a
-        # cooldown of 60s and it has not been used in 60s then that
-        # key should be deleted
-        current = current or time.time()
-        dead_keys = [
-            k for k, v in self._cache.items() if current > v._last + v.per
-        ]
-        for k in dead_keys:
-            del self._cache[k]
-
     def get_bucket(self, cooldown_key, current=None):
         self._verify_cache_integrity(current)
         key = self._bucket_key(cooldown_key)
         if key not in self._cache:
             bucket = self._cooldown.copy()
-            self._cache[key] = bucket
+            self._add_bucket(key, bucket)
         else:
             bucket = self._cache[key]
 
@@ -56,6 +56,15 @@ async def get_guild_channels(guild_id: int) -> Dict[str, Dict[int, str]]:
     return channels
 
 
+async def starboard_edited(starboard_id: int, guild_id: int):
+    # the bot caches starboards per cluster, so tell them to refresh
+    await app.config["WEBSOCKET"].send_command(
+        "starboard_edited",
+        {"starboard_id": starboard_id, "guild_id": guild_id},
+        expect_resp=False,
+    )
+
+
 async def handle_login(after_login: str = ""):
     return await discord.create_session(
         scope=["identify", "guilds"],
@@ -279,6 +288,7 @@ async def create_starboard(guild_id: int):
     except Exception as e:
         await flash(str(e), "error")
         return redirect(url_for("server_starboards", guild_id=guild_id))
+    await starboard_edited(channel_id, guild_id)
 
     return redirect(
         url_for("manage_starboard", guild_id=guild_id, starboard_id=channel_id)
@@ -303,6 +313,7 @@ async def delete_starboard(guild_id: int, starboard_id: int):
         return redirect(url_for("server_starboards", guild_id=guild_id))
 
     await db.db.starboards.delete(starboard_id)
+    await starboard_edited(starboard_id, guild_id)
     await flash("Starboard deleted.")
 
     return redirect(url_for("server_starboards", guild_id=guild_id))
@@ -15,6 +15,7 @@ class Wrapper:
             os.getenv("DB_NAME"),
             os.getenv("DB_USER"),
             os.getenv("DB_PASSWORD"),
+            os.getenv("DB_PGBOUNCER", "").lower() == "true",
         )
         self.ready = False
 
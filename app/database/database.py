@@ -1,9 +1,14 @@
+import asyncio
+import contextlib
 import pathlib
 import time
-from typing import Any, Dict, List, Optional
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import asyncpg
 
+from app.classes.latency_histogram import StatementStats
+
 from .database_functions import (
     aschannels,
     autoredeem,
@@ -19,17 +24,40 @@ from .database_functions import (
     users,
     xproles,
 )
+from .statements import statements
+
+# past this, new statements are all counted as one
+MAX_STATEMENTS = 1000
+OTHER_STATEMENTS = "(other statements)"
+
+
+def _status_rows(status: str) -> int:
+    # "INSERT 0 1", "UPDATE 3", "DELETE 0", etc.
+    last = status.rsplit(" ", 1)[-1]
+    return int(last) if last.isdigit() else 0
 
 
 class Database:
-    def __init__(self, database: str, user: str, password: str) -> None:
+    def __init__(
+        self,
+        database: str,
+        user: str,
+        password: str,
+        pgbouncer: bool = False,
+    ) -> None:
         self.name = database
         self.user = user
         self.password = password
+        # pgbouncer (in transaction mode) can run each query on a
+        # different server connection, so nothing can be prepared
+        self.pgbouncer = pgbouncer
 
         self.pool: Optional[asyncpg.pool.Pool] = None
 
-        self.sql_times: dict = {}
+        # normalised sql -> stats
+        self.sql_stats: Dict[str, StatementStats] = {}
+        # raw sql -> normalised sql
+        self._normalised: Dict[str, str] = {}
 
         self.guilds = guilds.Guilds(self)
         self.members = members.Members(self)
@@ -45,16 +73,41 @@ class Database:
         self.sb_messages = sb_messags.SBMessages(self)
         self.reactions = reactions.Reactions(self)
 
-    def log(self, sql: str, time: float) -> None:
-        self.sql_times.setdefault(sql, [])
-        self.sql_times[sql].append(time)
+    def log(
+        self, sql: str, exec_time: float, wait_time: float, rows: int
+    ) -> None:
+        key = self._normalised.get(sql)
+        if key is None:
+            key = " ".join(sql.split())
+            if len(self._normalised) < MAX_STATEMENTS:
+                self._normalised[sql] = key
+        stats = self.sql_stats.get(key)
+        if stats is None:
+            if len(self.sql_stats) >= MAX_STATEMENTS:
+                # sql that is built with values in it would otherwise
+                # grow this forever
+                key = OTHER_STATEMENTS
+                stats = self.sql_stats.get(key)
+            if stats is None:
+                stats = self.sql_stats[key] = StatementStats()
+        stats.add(exec_time, wait_time, rows)
+
+    def get_sql_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {sql: s.to_dict() for sql, s in self.sql_stats.items()}
 
     async def init_database(self, create_data: bool = False) -> None:
+        options: Dict[str, Any] = {}
+        if self.pgbouncer:
+            options["statement_cache_size"] = 0
+        elif not create_data:
+            # (the tables might not exist yet if create_data is True)
+            options["init"] = statements.prepare_all
         self.pool = await asyncpg.create_pool(
             database=self.name,
             user=self.user,
             password=self.password,
             host="127.0.0.1",
+            **options,
         )
         if not create_data:
             return
@@ -71,33 +124,125 @@ class Database:
                 with open(app_dir / "migrations.sql", "r") as f:
                     await con.execute(f.read())
 
-    async def execute(self, sql: str, *args: Any) -> None:
+    def current_session(self) -> Optional["Session"]:
+        session = _session.get()
+        if (
+            session is None
+            or session.db is not self
+            or session.closed
+            # tasks started inside a session inherit it, but they run
+            # concurrently, so they can't share its connection
+            or session.task is not asyncio.current_task()
+        ):
+            return None
+        return session
+
+    def in_transaction(self) -> bool:
+        """Whether this task's queries currently run in a transaction
+        (so anything they created might still be rolled back)."""
+        session = self.current_session()
+        return (
+            session is not None
+            and session.con is not None
+            and session.con.is_in_transaction()
+        )
+
+    @contextlib.asynccontextmanager
+    async def session(
+        self, transaction: bool = False
+    ) -> AsyncIterator["Session"]:
+        """Pins one connection for every query this task makes inside
+        the block, instead of taking one from the pool per query. The
+        connection is only acquired once the first query runs.
+
+        Queries outside a transaction are committed one by one, so
+        only ask for a transaction when the block needs to be atomic.
+        Nested sessions reuse the outer one (and nested transactions
+        become savepoints)."""
+
+        session = self.current_session()
+        if session is not None:
+            if transaction:
+                con = await session.connection()
+                async with con.transaction():
+                    yield session
+            else:
+                yield session
+            return
+
+        session = Session(self)
+        token = _session.set(session)
+        try:
+            if transaction:
+                con = await session.connection()
+                async with con.transaction():
+                    yield session
+            else:
+                yield session
+        finally:
+            session.closed = True
+            _session.reset(token)
+            if session.con is not None:
+                await self.pool.release(session.con)
+
+    @contextlib.asynccontextmanager
+    async def _connection(self) -> AsyncIterator[asyncpg.Connection]:
+        session = self.current_session()
+        if session is not None:
+            yield await session.connection()
+            return
         async with self.pool.acquire() as con:
-            async with con.transaction():
-                s = time.perf_counter()
-                await con.execute(sql, *args)
-        self.log(sql, time.perf_counter() - s)
+            yield con
+
+    async def execute(self, sql: str, *args: Any) -> None:
+        w = time.perf_counter()
+        async with self._connection() as con:
+            s = time.perf_counter()
+            status = await con.execute(sql, *args)
+            e = time.perf_counter()
+        self.log(sql, e - s, s - w, _status_rows(status))
 
     async def fetch(self, sql: str, *args: Any) -> List[Dict]:
-        async with self.pool.acquire() as con:
-            async with con.transaction():
-                s = time.perf_counter()
-                result = await con.fetch(sql, *args)
-        self.log(sql, time.perf_counter() - s)
+        w = time.perf_counter()
+        async with self._connection() as con:
+            s = time.perf_counter()
+            result = await con.fetch(sql, *args)
+            e = time.perf_counter()
+        self.log(sql, e - s, s - w, len(result))
         return result
 
     async def fetchrow(self, sql: str, *args: Any) -> Optional[dict]:
-        async with self.pool.acquire() as con:
-            async with con.transaction():
-                s = time.perf_counter()
-                result = await con.fetchrow(sql, *args)
-        self.log(sql, time.perf_counter() - s)
+        w = time.perf_counter()
+        async with self._connection() as con:
+            s = time.perf_counter()
+            result = await con.fetchrow(sql, *args)
+            e = time.perf_counter()
+        self.log(sql, e - s, s - w, int(result is not None))
         return result
 
     async def fetchval(self, sql: str, *args: Any) -> Optional[Any]:
-        async with self.pool.acquire() as con:
-            async with con.transaction():
-                s = time.perf_counter()
-                result = await con.fetchval(sql, *args)
-        self.log(sql, time.perf_counter() - s)
+        w = time.perf_counter()
+        async with self._connection() as con:
+            s = time.perf_counter()
+            result = await con.fetchval(sql, *args)
+            e = time.perf_counter()
+        self.log(sql, e - s, s - w, int(result is not None))
         return result
+
+
+class Session:
+    __slots__ = ("db", "con", "task", "closed")
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self.con: Optional[asyncpg.Connection] = None
+        self.task = asyncio.current_task()
+        self.closed = False
+
+    async def connection(self) -> asyncpg.Connection:
+        if self.con is None:
+            self.con = await self.db.pool.acquire()
+        return self.con
+
+
+_session: ContextVar[Optional[Session]] = ContextVar("session", default=None)
@@ -2,9 +2,9 @@ from typing import TYPE_CHECKING, Dict, List, Optional
 
 import asyncpg
 import buildpg
-import cachetools
 
 from app import commands, errors
+from app.classes.cache_registry import CountedTTLCache, caches
 from app.cogs.premium.premium_funcs import can_increase, limit_for
 from app.constants import MISSING
 from app.i18n import t_
@@ -16,7 +16,9 @@ if TYPE_CHECKING:
 class ASChannels:
     def __init__(self, db: "Database") -> None:
         self.db = db
-        self.id_cache = cachetools.TTLCache(5_000, 30)
+        self.id_cache = caches.register(
+            "aschannels.ids", CountedTTLCache(5_000, 30)
+        )
 
     def edited(self, aschannel_id: int):
         if aschannel_id in self.id_cache:
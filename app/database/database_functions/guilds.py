@@ -1,29 +1,49 @@
 import datetime
 from typing import TYPE_CHECKING, Optional
 
-import asyncpg
-import cachetools
-
 from app import commands, constants, errors, i18n
+from app.classes.async_cache import AsyncCache
+from app.classes.cache_registry import CountedLRUCache, caches
 from app.cogs.premium.premium_funcs import can_increase, limit_for
+from app.database.statements import statements
 from app.i18n import t_
 
 if TYPE_CHECKING:
     from app.database.database import Database
 
+GET_GUILD = statements.register(
+    "guilds.get",
+    """SELECT * FROM guilds
+    WHERE id=$1""",
+)
+
+CREATE_GUILD = statements.register(
+    "guilds.create",
+    """INSERT INTO guilds (id)
+    VALUES ($1)
+    ON CONFLICT DO NOTHING
+    RETURNING id""",
+)
+
 
 class Guilds:
     def __init__(self, db: "Database") -> None:
         self.db = db
-        self.cache = cachetools.TTLCache(1_000, ttl=30)
+        self.cache = caches.register("guilds", AsyncCache(1_000, ttl=30))
+        # ids of guilds that are known to exist
+        self.known = caches.register("guilds.known", CountedLRUCache(10_000))
 
     def edited(self, guild_id: int):
-        if guild_id in self.cache:
-            del self.cache[guild_id]
+        self.cache.pop(guild_id)
 
     async def delete(self, guild_id: int):
         await self.db.execute("""DELETE FROM guilds WHERE id=$1""", guild_id)
         self.edited(guild_id)
+        self.known.pop(guild_id, None)
+        self.db.members.forget_guild(guild_id)
+        # its starboards and permgroups were deleted along with it
+        self.db.starboards.edited_guild(guild_id)
+        self.db.permgroups.edited(guild_id)
 
     async def add_prefix(self, guild_id: int, prefix: str):
         if len(prefix) > 8:
@@ -151,30 +171,20 @@ class Guilds:
         self.edited(guild_id)
 
     async def get(self, guild_id: int) -> Optional[dict]:
-        r = self.cache.get(guild_id, default=constants.MISSING)
-        if r is not constants.MISSING:
-            return r
-        sql_guild = await self.db.fetchrow(
-            """SELECT * FROM guilds
-            WHERE id=$1""",
+        return await self.cache.get(
             guild_id,
+            lambda: self.db.fetchrow(GET_GUILD, guild_id),
         )
-        self.cache[guild_id] = sql_guild
-        return sql_guild
-
-    async def create(self, guild_id: int, check_first: bool = True) -> bool:
-        if check_first:
-            exists = await self.get(guild_id) is not None
-            if exists:
-                return False
-
-        try:
-            await self.db.execute(
-                """INSERT INTO guilds (id)
-                VALUES ($1)""",
-                guild_id,
-            )
-        except asyncpg.exceptions.UniqueViolationError:
+
+    async def create(self, guild_id: int) -> bool:
+        """Returns True if the guild was created."""
+        if self.known.get(guild_id):
+            return False
+
+        created = await self.db.fetchval(CREATE_GUILD, guild_id)
+        if not self.db.in_transaction():
+            self.known[guild_id] = True
+        if created is None:
             return False
         self.edited(guild_id)
         return True
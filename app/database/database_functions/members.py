@@ -1,37 +1,231 @@
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
-import asyncpg
+from app.classes.async_cache import AsyncCache
+from app.classes.cache_registry import CountedLRUCache, caches
+from app.classes.leaderboard import Leaderboard
+from app.database.statements import statements
+
+GET_MEMBER = statements.register(
+    "members.get",
+    """SELECT * FROM members
+    WHERE user_id=$1 AND guild_id=$2""",
+)
+
+# the guild (and the user, if $3 isn't null) are created along with the
+# member, since the member references both
+CREATE_MEMBER = statements.register(
+    "members.create",
+    """WITH new_guild AS (
+        INSERT INTO guilds (id)
+        VALUES ($2)
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    ), new_user AS (
+        INSERT INTO users (id, is_bot)
+        SELECT $1, $3::bool WHERE $3::bool IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    ), new_member AS (
+        INSERT INTO members (user_id, guild_id)
+        VALUES ($1, $2)
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    )
+    SELECT
+        EXISTS(SELECT 1 FROM new_guild) AS new_guild,
+        EXISTS(SELECT 1 FROM new_member) AS new_member""",
+)
+
+ADD_COUNTERS = statements.register(
+    "members.add_counters",
+    """UPDATE members m
+    SET stars_given = m.stars_given + c.stars_given,
+        stars_received = m.stars_received + c.stars_received,
+        xp = m.xp + c.xp
+    FROM unnest($1::numeric[], $2::numeric[], $3::int[], $4::int[], $5::int[])
+        AS c (user_id, guild_id, stars_given, stars_received, xp),
+        users u
+    WHERE m.user_id=c.user_id AND m.guild_id=c.guild_id
+    AND u.id=m.user_id
+    RETURNING m.user_id, m.guild_id, m.xp, m.level, c.xp AS xp_added,
+        u.is_bot""",
+)
+
+# levels only ever go up, so a stale level can't overwrite a newer one
+SET_LEVELS = statements.register(
+    "members.set_levels",
+    """UPDATE members m
+    SET level = l.level
+    FROM unnest($1::numeric[], $2::numeric[], $3::smallint[])
+        AS l (user_id, guild_id, level)
+    WHERE m.user_id=l.user_id AND m.guild_id=l.guild_id
+    AND m.level < l.level
+    RETURNING m.user_id, m.guild_id, m.level""",
+)
+
+# members with the same xp share a rank
+GET_RANK = statements.register(
+    "members.get_rank",
+    """SELECT COUNT(*) + 1 FROM members m
+    JOIN users u ON u.id=m.user_id
+    WHERE m.guild_id=$1 AND m.xp > $2
+    AND NOT u.is_bot""",
+)
+
+# ordered the same way Leaderboard orders members
+GET_LEADERBOARD = statements.register(
+    "members.get_leaderboard",
+    """SELECT m.user_id, m.xp, m.level FROM members m
+    JOIN users u ON u.id=m.user_id
+    WHERE m.guild_id=$1 AND m.xp > 0
+    AND NOT u.is_bot
+    ORDER BY m.xp DESC, m.user_id
+    LIMIT $2""",
+)
+
+RESET_XP = statements.register(
+    "members.reset_xp",
+    """UPDATE members
+    SET xp=0,
+    level=0
+    WHERE guild_id=$1""",
+)
+
+SET_XP = statements.register(
+    "members.set_xp",
+    """UPDATE members
+    SET xp=$1,
+    level=$2
+    WHERE user_id=$3
+    AND guild_id=$4""",
+)
+
+# how many members each guild's leaderboard holds
+LEADERBOARD_SIZE = 200
 
 
 class Members:
     def __init__(self, db) -> None:
         self.db = db
+        # (user_id, guild_id) of members that are known to exist
+        self.known = caches.register("members.known", CountedLRUCache(50_000))
+        # guild_id -> Leaderboard, kept up to date as xp changes (the
+        # ttl only limits how long anything missed could go unnoticed)
+        self.leaderboards = caches.register(
+            "members.leaderboards", AsyncCache(500, ttl=600)
+        )
 
     async def get(self, user_id: int, guild_id: int) -> Optional[dict]:
-        return await self.db.fetchrow(
-            """SELECT * FROM members
-            WHERE user_id=$1 AND guild_id=$2""",
-            user_id,
-            guild_id,
-        )
+        return await self.db.fetchrow(GET_MEMBER, user_id, guild_id)
+
+    async def get_rank(self, guild_id: int, xp: int) -> int:
+        """The rank that a member with this much xp has in the guild,
+        not counting bots."""
+        return await self.db.fetchval(GET_RANK, guild_id, xp)
+
+    async def get_leaderboard(self, guild_id: int) -> Leaderboard:
+        async def load() -> Leaderboard:
+            rows = await self.db.fetch(
+                GET_LEADERBOARD, guild_id, LEADERBOARD_SIZE
+            )
+            return Leaderboard(
+                [(int(r["user_id"]), r["xp"], r["level"]) for r in rows],
+                LEADERBOARD_SIZE,
+            )
+
+        return await self.leaderboards.get(guild_id, load)
+
+    def edited_leaderboard(self, guild_id: int) -> None:
+        self.leaderboards.pop(guild_id)
+
+    def _update_leaderboard(
+        self, guild_id: int, user_id: int, xp: int, level: int
+    ) -> None:
+        board = self.leaderboards.peek(guild_id)
+        # (popping also stops a load that might have missed this change)
+        if board is None or not board.update(user_id, xp, level):
+            self.leaderboards.pop(guild_id)
+
+    async def reset_xp(self, guild_id: int) -> None:
+        await self.db.execute(RESET_XP, guild_id)
+        self.edited_leaderboard(guild_id)
+
+    async def set_xp(
+        self, user_id: int, guild_id: int, xp: int, level: int
+    ) -> None:
+        await self.db.execute(SET_XP, xp, level, user_id, guild_id)
+        self.edited_leaderboard(guild_id)
 
     async def create(
-        self, user_id: int, guild_id: int, check_first: bool = True
+        self, user_id: int, guild_id: int, is_bot: Optional[bool] = None
     ) -> bool:
-        if check_first:
-            exists = await self.get(user_id, guild_id) is not None
-            if exists:
-                return True
-
-        await self.db.guilds.create(guild_id)
-
-        try:
-            await self.db.execute(
-                """INSERT INTO members (user_id, guild_id)
-                VALUES ($1, $2)""",
-                user_id,
-                guild_id,
-            )
-        except asyncpg.exceptions.UniqueViolationError:
+        """Creates the member, and the guild if needed. If is_bot is
+        passed the user is created too, otherwise it has to exist
+        already. Returns True if the member already existed."""
+
+        if self.known.get((user_id, guild_id)):
             return True
-        return False
+        if is_bot is not None and self.db.users.known.get(user_id):
+            is_bot = None
+
+        r = await self.db.fetchrow(CREATE_MEMBER, user_id, guild_id, is_bot)
+        if r["new_guild"]:
+            self.db.guilds.edited(guild_id)
+        if not self.db.in_transaction():
+            self.known[(user_id, guild_id)] = True
+            self.db.guilds.known[guild_id] = True
+            if is_bot is not None:
+                self.db.users.known[user_id] = True
+        return not r["new_member"]
+
+    def forget_guild(self, guild_id: int) -> None:
+        for key in [k for k in self.known if k[1] == guild_id]:
+            self.known.pop(key, None)
+        self.edited_leaderboard(guild_id)
+
+    async def add_counters(
+        self, changes: Dict[Tuple[int, int], Tuple[int, int, int]]
+    ) -> List[dict]:
+        """Adds (stars_given, stars_received, xp) to each (user_id,
+        guild_id) in one statement. Returns the new xp and level of
+        each member, along with how much xp was added."""
+
+        keys = list(changes)
+        values = list(changes.values())
+        rows = await self.db.fetch(
+            ADD_COUNTERS,
+            [k[0] for k in keys],
+            [k[1] for k in keys],
+            [v[0] for v in values],
+            [v[1] for v in values],
+            [v[2] for v in values],
+        )
+        for r in rows:
+            if r["xp_added"] and not r["is_bot"]:
+                self._update_leaderboard(
+                    int(r["guild_id"]), int(r["user_id"]), r["xp"], r["level"]
+                )
+        return rows
+
+    async def set_levels(
+        self, levels: Dict[Tuple[int, int], int]
+    ) -> List[dict]:
+        """Raises the level of each (user_id, guild_id). Returns the
+        members that actually leveled up."""
+
+        keys = list(levels)
+        rows = await self.db.fetch(
+            SET_LEVELS,
+            [k[0] for k in keys],
+            [k[1] for k in keys],
+            list(levels.values()),
+        )
+        for r in rows:
+            guild_id = int(r["guild_id"])
+            board = self.leaderboards.peek(guild_id)
+            if board is None:
+                # stops a load that might have read the old level
+                self.leaderboards.pop(guild_id)
+            else:
+                board.set_level(int(r["user_id"]), r["level"])
+        return rows
@@ -1,18 +1,112 @@
+import asyncio
+from typing import Iterable, List, Optional, Tuple
+
 import asyncpg
 
 from app import errors
+from app.classes.bloom_filter import BloomFilter
+from app.database.statements import statements
+
+GET_MESSAGE = statements.register(
+    "messages.get",
+    """SELECT * FROM messages
+    WHERE id=$1""",
+)
+
+CREATE_MESSAGE = statements.register(
+    "messages.create",
+    """INSERT INTO messages
+    (id, guild_id, channel_id, author_id, is_nsfw)
+    VALUES ($1, $2, $3, $4, $5)""",
+)
 
 
 class Messages:
     def __init__(self, db) -> None:
         self.db = db
 
-    async def get(self, message_id: int) -> dict:
-        return await self.db.fetchrow(
-            """SELECT * FROM messages
-            WHERE id=$1""",
-            message_id,
+        # every message and starboard message id in this cluster's
+        # guilds, so deletes of anything else can skip the database
+        self.known: Optional[BloomFilter] = None
+        self.known_ready = False
+        # ids remembered while the filter is being (re)built
+        self._pending: Optional[List[int]] = None
+        self._shards: Optional[Tuple[List[int], int]] = None
+        # how many items the filter can take before it's rebuilt
+        self._reseed_at = 0
+
+        self.known_checks = 0
+        self.known_skips = 0
+
+    def remember(self, message_id: int) -> None:
+        message_id = int(message_id)
+        if self._pending is not None:
+            self._pending.append(message_id)
+        if self.known is None:
+            return
+        self.known.add(message_id)
+        if self.known.count > self._reseed_at and self._pending is None:
+            # it's filling up past the error rate it was sized for, so
+            # build a bigger one. also backs off if that fails
+            self._reseed_at = self.known.count * 2
+            asyncio.create_task(self.seed_known(*self._shards))
+
+    def maybe_known(self, message_id: int) -> bool:
+        """Returns False if the message is definitely not in either the
+        messages or starboard_messages table. Always True until
+        seed_known() has finished."""
+        if not self.known_ready:
+            return True
+        self.known_checks += 1
+        if message_id in self.known:
+            return True
+        self.known_skips += 1
+        return False
+
+    async def seed_known(
+        self, shard_ids: Iterable[int], shard_count: int
+    ) -> None:
+        """Builds the filter. If there already is one, it keeps being
+        used until the new one is done."""
+        shard_ids = list(shard_ids)
+        self._shards = (shard_ids, shard_count)
+        ids_sql = """WITH ours AS (
+            SELECT id FROM messages
+            WHERE (guild_id::bigint >> 22) % $1 = ANY($2::int[])
         )
+        SELECT id FROM ours
+        UNION ALL
+        SELECT id FROM starboard_messages
+        WHERE orig_id IN (SELECT id FROM ours)"""
+
+        self._pending = []
+        try:
+            count = await self.db.fetchval(
+                f"SELECT COUNT(*) FROM ({ids_sql}) ids",
+                shard_count,
+                shard_ids,
+            )
+
+            # leave room for the messages created until the next restart
+            capacity = max(count * 2, 100_000)
+            known = BloomFilter(capacity)
+            async with self.db.pool.acquire() as con:
+                async with con.transaction():
+                    async for row in con.cursor(
+                        ids_sql, shard_count, shard_ids, prefetch=10_000
+                    ):
+                        known.add(int(row["id"]))
+            for message_id in self._pending:
+                known.add(message_id)
+        finally:
+            self._pending = None
+
+        self.known = known
+        self._reseed_at = capacity
+        self.known_ready = True
+
+    async def get(self, message_id: int) -> dict:
+        return await self.db.fetchrow(GET_MESSAGE, message_id)
 
     async def create(
         self,
@@ -23,33 +117,33 @@ class Messages:
         is_nsfw: bool,
         check_first: bool = True,
     ) -> bool:
-        if check_first:
-            exists = await self.get(message_id) is not None
-            if exists:
-                return True
+        async with self.db.session():
+            if check_first:
+                exists = await self.get(message_id) is not None
+                if exists:
+                    return True
 
-        is_starboard_message = (
-            await self.db.sb_messages.get(message_id) is not None
-        )
-        if is_starboard_message:
-            raise errors.AlreadyStarboardMessage(
-                f"Could not create message {message_id} "
-                "because it is already starboard message."
+            is_starboard_message = (
+                await self.db.sb_messages.get(message_id) is not None
             )
+            if is_starboard_message:
+                raise errors.AlreadyStarboardMessage(
+                    f"Could not create message {message_id} "
+                    "because it is already starboard message."
+                )
 
-        await self.db.guilds.create(guild_id)
+            await self.db.guilds.create(guild_id)
 
-        try:
-            await self.db.execute(
-                """INSERT INTO messages
-                (id, guild_id, channel_id, author_id, is_nsfw)
-                VALUES ($1, $2, $3, $4, $5)""",
-                message_id,
-                guild_id,
-                channel_id,
-                author_id,
-                is_nsfw,
-            )
-        except asyncpg.exceptions.UniqueViolationError:
-            return True
-        return False
+            try:
+                await self.db.execute(
+                    CREATE_MESSAGE,
+                    message_id,
+                    guild_id,
+                    channel_id,
+                    author_id,
+                    is_nsfw,
+                )
+            except asyncpg.exceptions.UniqueViolationError:
+                return True
+            self.remember(message_id)
+            return False
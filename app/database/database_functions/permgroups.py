@@ -1,8 +1,11 @@
 import typing
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from app import errors
+from app.classes.cache_registry import CountedLRUCache, caches
+from app.classes.perm_matrix import PermMatrix
 from app.cogs.premium.premium_funcs import can_increase, limit_for
+from app.constants import MISSING
 
 if typing.TYPE_CHECKING:
     from app.database.database import Database
@@ -11,6 +14,45 @@ if typing.TYPE_CHECKING:
 class PermGroups:
     def __init__(self, db: "Database"):
         self.db = db
+        self.matrix_cache = caches.register(
+            "permgroups.matrix", CountedLRUCache(5_000)
+        )
+        # guild_id -> the load that's allowed to fill matrix_cache
+        self._loading: Dict[int, object] = {}
+        # guild_id -> how many times its permissions were edited
+        self._generations: Dict[int, int] = {}
+
+    def generation(self, guild_id: int) -> int:
+        """Changes whenever the guild's permissions are edited, so that
+        anything computed from them can tell it is out of date."""
+        return self._generations.get(int(guild_id), 0)
+
+    def edited(self, guild_id: int):
+        guild_id = int(guild_id)
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+        if guild_id in self.matrix_cache:
+            del self.matrix_cache[guild_id]
+        # a load that started before this edit may have old data
+        self._loading.pop(guild_id, None)
+
+    async def get_matrix(self, guild_id: int) -> PermMatrix:
+        guild_id = int(guild_id)
+        r = self.matrix_cache.get(guild_id, default=MISSING)
+        if r is not MISSING:
+            return r
+
+        token = self._loading[guild_id] = object()
+        groups = await self.get_many(guild_id)
+        permroles = await self.db.fetch(
+            """SELECT * FROM permroles
+            WHERE permgroup_id=any($1::bigint[])""",
+            [g["id"] for g in groups],
+        )
+        matrix = PermMatrix(groups, permroles)
+        if self._loading.get(guild_id) is token:
+            del self._loading[guild_id]
+            self.matrix_cache[guild_id] = matrix
+        return matrix
 
     async def create(self, guild_id: int, name: str):
         name = name.casefold()
@@ -36,6 +78,7 @@ class PermGroups:
             name,
             index,
         )
+        self.edited(guild_id)
 
     async def delete(self, permgroup_id: int):
         group = await self.get_id(permgroup_id)
@@ -52,6 +95,7 @@ class PermGroups:
             group["index"],
             group["guild_id"],
         )
+        self.edited(group["guild_id"])
 
     async def move(self, permgroup_id: int, new_index: int) -> int:
         group = await self.get_id(permgroup_id)
@@ -87,6 +131,7 @@ class PermGroups:
             new_index,
             permgroup_id,
         )
+        self.edited(group["guild_id"])
         return new_index
 
     async def set_starboards(self, permgroup_id: int, starboards: List[int]):
@@ -97,6 +142,7 @@ class PermGroups:
             starboards,
             permgroup_id,
         )
+        await self.edited_id(permgroup_id)
 
     async def set_channels(self, permgroup_id: int, channels: List[int]):
         await self.db.execute(
@@ -106,6 +152,12 @@ class PermGroups:
             channels,
             permgroup_id,
         )
+        await self.edited_id(permgroup_id)
+
+    async def edited_id(self, permgroup_id: int):
+        group = await self.get_id(permgroup_id)
+        if group:
+            self.edited(group["guild_id"])
 
     async def get_many(self, guild_id: int) -> List[dict]:
         return await self.db.fetch(
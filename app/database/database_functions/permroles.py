@@ -38,6 +38,7 @@ class PermRoles:
             role_id,
             next_index,
         )
+        self.db.permgroups.edited(guild_id)
 
     async def delete(self, role_id: int, group_id: int):
         permrole = await self.get(role_id, group_id)
@@ -54,6 +55,7 @@ class PermRoles:
             group_id,
             permrole["index"],
         )
+        await self.db.permgroups.edited_id(group_id)
 
     async def move(self, role_id: int, group_id: int, index: int) -> int:
         permroles = await self.get_many(group_id)
@@ -92,6 +94,7 @@ class PermRoles:
             role_id,
             group_id,
         )
+        await self.db.permgroups.edited_id(group_id)
 
         return index
 
@@ -148,3 +151,4 @@ class PermRoles:
         )
 
         await self.db.execute(query, *args)
+        await self.db.permgroups.edited_id(group_id)
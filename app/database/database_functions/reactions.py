@@ -1,12 +1,84 @@
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, List, Optional
 
 import asyncpg
 
-from app import errors
+from app.database.statements import statements
 
 if TYPE_CHECKING:
     from app.database.database import Database
 
+GET_REACTION = statements.register(
+    "reactions.get_reaction",
+    """SELECT * FROM reactions
+    WHERE emoji=$1 AND message_id=$2""",
+)
+
+GET_REACTIONS = statements.register(
+    "reactions.get_reactions",
+    """SELECT * FROM reactions
+    WHERE message_id=$1
+    AND emoji=any($2::TEXT[])""",
+)
+
+GET_REACTION_USER = statements.register(
+    "reactions.get_reaction_user",
+    """SELECT * FROM reaction_users
+    WHERE reaction_id=$1 AND user_id=$2""",
+)
+
+GET_REACTION_USERS = statements.register(
+    "reactions.get_reaction_users",
+    """SELECT * FROM reaction_users
+    WHERE reaction_id=any($1::INT[])
+    AND ($2::numeric IS NULL OR $2::numeric!=user_id)""",
+)
+
+CREATE_REACTION = statements.register(
+    "reactions.create_reaction",
+    """INSERT INTO reactions
+    (emoji, message_id)
+    VALUES ($1, $2)""",
+)
+
+# The reaction is looked up if it already exists, instead of being
+# touched by an ON CONFLICT DO UPDATE just so that RETURNING gives its
+# id back. reaction_id is null if the reaction was created by another
+# transaction after this statement started, since it can't see it.
+CREATE_REACTION_USER = statements.register(
+    "reactions.create_reaction_user",
+    """WITH new_reaction AS (
+        INSERT INTO reactions (emoji, message_id)
+        VALUES ($1, $2)
+        ON CONFLICT (emoji, message_id) DO NOTHING
+        RETURNING id
+    ), reaction AS (
+        SELECT id FROM new_reaction
+        UNION ALL
+        SELECT id FROM reactions
+        WHERE emoji=$1 AND message_id=$2
+        LIMIT 1
+    ), new_user AS (
+        INSERT INTO reaction_users (reaction_id, user_id)
+        SELECT id, $3 FROM reaction
+        ON CONFLICT (reaction_id, user_id) DO NOTHING
+        RETURNING reaction_id
+    )
+    SELECT
+        (SELECT id FROM reaction) AS reaction_id,
+        EXISTS(SELECT 1 FROM new_user) AS created""",
+)
+
+DELETE_REACTION_USER = statements.register(
+    "reactions.delete_reaction_user",
+    """DELETE FROM reaction_users
+    USING reactions
+    WHERE reactions.id=reaction_users.reaction_id
+    AND reactions.emoji=$1
+    AND reactions.message_id=$2
+    AND reaction_users.user_id=$3
+    RETURNING reaction_users.reaction_id""",
+)
+
 
 class Reactions:
     def __init__(self, db: "Database") -> None:
@@ -15,12 +87,12 @@ class Reactions:
     async def get_reaction(
         self, emoji: str, message_id: int
     ) -> Optional[dict]:
-        return await self.db.fetchrow(
-            """SELECT * FROM reactions
-            WHERE emoji=$1 AND message_id=$2""",
-            emoji,
-            message_id,
-        )
+        return await self.db.fetchrow(GET_REACTION, emoji, message_id)
+
+    async def get_reactions(
+        self, message_id: int, emojis: List[str]
+    ) -> List[dict]:
+        return await self.db.fetch(GET_REACTIONS, message_id, emojis)
 
     async def create_reaction(
         self, emoji: str, message_id: int, check_first: bool = True
@@ -31,13 +103,7 @@ class Reactions:
                 return True
 
         try:
-            await self.db.execute(
-                """INSERT INTO reactions
-                (emoji, message_id)
-                VALUES ($1, $2)""",
-                emoji,
-                message_id,
-            )
+            await self.db.execute(CREATE_REACTION, emoji, message_id)
         except asyncpg.exceptions.UniqueViolationError:
             return True
         return False
@@ -49,54 +115,38 @@ class Reactions:
         if reaction is None:
             return None
         return await self.db.fetchrow(
-            """SELECT * FROM reaction_users
-            WHERE reaction_id=$1 AND user_id=$2""",
-            reaction["id"],
-            user_id,
+            GET_REACTION_USER, reaction["id"], user_id
+        )
+
+    async def get_reaction_users(
+        self, reaction_ids: List[int], exclude_user_id: Optional[int] = None
+    ) -> List[dict]:
+        return await self.db.fetch(
+            GET_REACTION_USERS, reaction_ids, exclude_user_id
         )
 
     async def create_reaction_user(
-        self,
-        emoji: str,
-        message_id: int,
-        user_id: int,
-        check_first: bool = True,
+        self, emoji: str, message_id: int, user_id: int
     ) -> bool:
-        if check_first:
-            exists = await self.get_reaction_user(emoji, message_id, user_id)
-            if exists:
-                return True
-
-        await self.create_reaction(emoji, message_id)
-
-        reaction = await self.get_reaction(emoji, message_id)
-        if not reaction:
-            raise errors.NotInDatabase(
-                f"Created reaction {emoji}, {message_id}, but "
-                "count not find it."
-            )
-
-        try:
-            await self.db.execute(
-                """INSERT INTO reaction_users
-                (reaction_id, user_id)
-                VALUES ($1, $2)""",
-                reaction["id"],
-                user_id,
+        """Creates the reaction (if needed) and the reaction user in a
+        single statement. Returns True if the reaction user already
+        existed."""
+        r = await self.db.fetchrow(
+            CREATE_REACTION_USER, emoji, message_id, user_id
+        )
+        if r["reaction_id"] is None:
+            # the reaction was just created concurrently, and is
+            # visible now
+            r = await self.db.fetchrow(
+                CREATE_REACTION_USER, emoji, message_id, user_id
             )
-        except asyncpg.exceptions.UniqueViolationError:
-            return True
-        return False
+        return not r["created"]
 
     async def delete_reaction_user(
         self, emoji: str, message_id: int, user_id: int
-    ) -> None:
-        reaction = await self.get_reaction(emoji, message_id)
-        if reaction is None:
-            return
-        await self.db.execute(
-            """DELETE FROM reaction_users
-            WHERE reaction_id=$1 AND user_id=$2""",
-            reaction["id"],
-            user_id,
+    ) -> bool:
+        """Returns whether or not the reaction user existed."""
+        deleted = await self.db.fetchval(
+            DELETE_REACTION_USER, emoji, message_id, user_id
         )
+        return deleted is not None
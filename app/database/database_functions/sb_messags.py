@@ -1,22 +1,172 @@
-from typing import TYPE_CHECKING, Optional
+import random
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import asyncpg
 
 from app import errors
+from app.classes.cache_registry import CountedLRUCache, caches
+from app.constants import MISSING
+from app.database.statements import statements
 
 if TYPE_CHECKING:
     from app.database.database import Database
 
+GET_SB_MESSAGE = statements.register(
+    "sb_messages.get",
+    """SELECT * FROM starboard_messages
+    WHERE id=$1""",
+)
+
+GET_SB_MESSAGE_BY_ORIG = statements.register(
+    "sb_messages.get_by_orig",
+    """SELECT * FROM starboard_messages
+    WHERE orig_id=$1 AND starboard_id=$2""",
+)
+
+CREATE_SB_MESSAGE = statements.register(
+    "sb_messages.create",
+    """INSERT INTO starboard_messages
+    (id, orig_id, starboard_id)
+    VALUES ($1, $2, $3)""",
+)
+
+SET_POINTS = statements.register(
+    "sb_messages.set_points",
+    """UPDATE starboard_messages
+    SET points=$1 WHERE id=$2""",
+)
+
+SET_POINTS_AND_RENDER_HASH = statements.register(
+    "sb_messages.set_points_and_render_hash",
+    """UPDATE starboard_messages
+    SET points=$1, render_hash=$2 WHERE id=$3""",
+)
+
+SET_RENDER_HASH = statements.register(
+    "sb_messages.set_render_hash",
+    """UPDATE starboard_messages
+    SET render_hash=$1 WHERE id=$2""",
+)
+
+# the starboard messages that explore commands (moststarred and random)
+# can show. $1 starboard ids, $2 author id, $3 channel id, $4 and $5
+# min and max points, $6 and $7 the ids to be newer and older than
+_EXPLORABLE = """($6::numeric is NULL or id>$6)
+        AND ($7::numeric is NULL or id<$7)
+        AND ($4::smallint is NULL or points >= $4::smallint)
+        AND ($5::smallint is NULL or points <= $5::smallint)
+        AND EXISTS(
+            SELECT * FROM messages
+            WHERE id=orig_id
+            AND ($2::numeric is NULL or author_id=$2::numeric)
+            AND ($3::numeric is NULL or channel_id=$3::numeric)
+            AND trashed=False
+        )"""
+
+# Each starboard is read in order from its own part of an index on
+# (starboard_id, ...) and the results are merged, so only about as many
+# rows as are returned are read. $8 is how many rows to return.
+_EXPLORE = (
+    """SELECT sm.* FROM unnest($1::numeric[]) AS s (sb_id)
+    CROSS JOIN LATERAL (
+        SELECT * FROM starboard_messages
+        WHERE starboard_id=s.sb_id
+        AND """
+    + _EXPLORABLE
+    + """
+        {cursor}
+        ORDER BY {order}
+        LIMIT {inner_limit}
+    ) AS sm
+    ORDER BY {order}
+    LIMIT $8 {offset}"""
+)
+
+# by points (then id), skipping the first $9 rows
+MOST_STARRED = _EXPLORE.format(
+    cursor="",
+    order="points DESC, id DESC",
+    inner_limit="$8::int + $9::int",
+    offset="OFFSET $9",
+)
+# the rows after ($9, $10)
+MOST_STARRED_AFTER = _EXPLORE.format(
+    cursor="AND (points, id) < ($9::smallint, $10::numeric)",
+    order="points DESC, id DESC",
+    inner_limit="$8",
+    offset="",
+)
+# the rows before ($9, $10), closest first
+MOST_STARRED_BEFORE = _EXPLORE.format(
+    cursor="AND (points, id) > ($9::smallint, $10::numeric)",
+    order="points, id",
+    inner_limit="$8",
+    offset="",
+)
+
+# by id, from $9 on
+FIRST_EXPLORABLE_FROM = _EXPLORE.format(
+    cursor="AND id >= $9::numeric",
+    order="id",
+    inner_limit="$8",
+    offset="",
+)
+# by id (newest first), from $9 back
+LAST_EXPLORABLE_FROM = _EXPLORE.format(
+    cursor="AND id <= $9::numeric",
+    order="id DESC",
+    inner_limit="$8",
+    offset="",
+)
+
+# $8 is where it stops counting
+COUNT_EXPLORABLE = (
+    """SELECT COUNT(*) FROM (
+        SELECT 1 FROM starboard_messages
+        WHERE starboard_id=any($1::numeric[])
+        AND """
+    + _EXPLORABLE
+    + """
+        LIMIT $8
+    ) AS t"""
+)
+
+# larger than any id
+MAX_SNOWFLAKE = 2**64
+
+# (starboard_ids, author_id, channel_id, min_points, max_points,
+# newer_than, older_than)
+ExploreFilters = Tuple[
+    List[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+]
+
 
 class SBMessages:
     def __init__(self, db: "Database") -> None:
         self.db = db
+        # starboard message id -> hash of what it was last edited to
+        self.render_hashes = caches.register(
+            "sb_messages.render_hashes", CountedLRUCache(10_000)
+        )
+        # hashes of edits that are saved with the next set_points
+        self.unsaved_hashes = caches.register(
+            "sb_messages.unsaved_hashes", CountedLRUCache(10_000)
+        )
 
     async def get(self, message_id: int) -> Optional[dict]:
+        return await self.db.fetchrow(GET_SB_MESSAGE, message_id)
+
+    async def get_by_orig(
+        self, orig_id: int, starboard_id: int
+    ) -> Optional[dict]:
         return await self.db.fetchrow(
-            """SELECT * FROM starboard_messages
-            WHERE id=$1""",
-            message_id,
+            GET_SB_MESSAGE_BY_ORIG, orig_id, starboard_id
         )
 
     async def create(
@@ -26,34 +176,141 @@ class SBMessages:
         starboard_id: int,
         check_first: bool = True,
     ) -> bool:
-        if check_first:
-            exists = await self.get(message_id)
-            if exists:
-                return True
+        async with self.db.session():
+            if check_first:
+                exists = await self.get(message_id)
+                if exists:
+                    return True
 
-        already_orig_message = (
-            await self.db.messages.get(message_id) is not None
-        )
-        if already_orig_message:
-            raise errors.AlreadyOrigMessage(
-                f"Could not create starboard message {message_id} "
-                "because it is already a normal message."
+            already_orig_message = (
+                await self.db.messages.get(message_id) is not None
             )
+            if already_orig_message:
+                raise errors.AlreadyOrigMessage(
+                    f"Could not create starboard message {message_id} "
+                    "because it is already a normal message."
+                )
 
-        try:
-            await self.db.execute(
-                """INSERT INTO starboard_messages
-                (id, orig_id, starboard_id)
-                VALUES ($1, $2, $3)""",
-                message_id,
-                orig_id,
-                starboard_id,
-            )
-        except asyncpg.exceptions.UniqueViolationError:
-            return True
-        return False
+            try:
+                await self.db.execute(
+                    CREATE_SB_MESSAGE, message_id, orig_id, starboard_id
+                )
+            except asyncpg.exceptions.UniqueViolationError:
+                return True
+            self.db.messages.remember(message_id)
+            return False
 
     async def delete(self, message_id: int) -> None:
         await self.db.execute(
             """DELETE FROM starboard_messages WHERE id=$1""", message_id
         )
+        self.render_hashes.pop(message_id, None)
+        self.unsaved_hashes.pop(message_id, None)
+
+    async def get_most_starred(
+        self,
+        filters: ExploreFilters,
+        limit: int,
+        offset: int = 0,
+        after: Optional[dict] = None,
+        before: Optional[dict] = None,
+    ) -> List[dict]:
+        """Starboard messages by points (then id), highest first. Pass
+        the row to continue from as after (or before, which returns the
+        rows before it closest first) instead of an offset whenever
+        possible, since offsets still have to be read past."""
+        if after is not None:
+            return await self.db.fetch(
+                MOST_STARRED_AFTER,
+                *filters,
+                limit,
+                after["points"],
+                after["id"],
+            )
+        if before is not None:
+            return await self.db.fetch(
+                MOST_STARRED_BEFORE,
+                *filters,
+                limit,
+                before["points"],
+                before["id"],
+            )
+        return await self.db.fetch(MOST_STARRED, *filters, limit, offset)
+
+    async def count_explorable(
+        self, filters: ExploreFilters, limit: int
+    ) -> int:
+        """How many messages match the filters, counting no further
+        than limit."""
+        return await self.db.fetchval(COUNT_EXPLORABLE, *filters, limit)
+
+    async def get_random(self, filters: ExploreFilters) -> Optional[dict]:
+        """A random message that matches the filters, without reading
+        all of them. A random id between the first and last match is
+        picked, and the first match from there on is returned.
+
+        Since ids are snowflakes, this picks a random point in time, so
+        messages that were sent after a long quiet stretch are more
+        likely to be picked than ones sent close together."""
+        first = await self.db.fetchrow(FIRST_EXPLORABLE_FROM, *filters, 1, 0)
+        if first is None:
+            return None
+        last = await self.db.fetchrow(
+            LAST_EXPLORABLE_FROM, *filters, 1, MAX_SNOWFLAKE
+        )
+        if last is None:
+            return first
+        probe = random.randint(int(first["id"]), int(last["id"]))
+        choice = await self.db.fetchrow(
+            FIRST_EXPLORABLE_FROM, *filters, 1, probe
+        )
+        return choice or first
+
+    async def set_points(
+        self,
+        message_id: int,
+        points: int,
+        render_hash: Optional[str] = MISSING,
+    ) -> None:
+        """Also saves render_hash if it's passed, or else the hash of
+        the last edit if it hasn't been saved yet."""
+        if render_hash is MISSING:
+            render_hash = self.unsaved_hashes.pop(message_id, MISSING)
+        else:
+            self.render_hashes[message_id] = render_hash
+            self.unsaved_hashes.pop(message_id, None)
+
+        if render_hash is MISSING:
+            await self.db.execute(SET_POINTS, points, message_id)
+        else:
+            await self.db.execute(
+                SET_POINTS_AND_RENDER_HASH, points, render_hash, message_id
+            )
+
+    def get_render_hash(
+        self, message_id: int, default: Optional[str]
+    ) -> Optional[str]:
+        """The hash of what the message was last edited to show. Falls
+        back to default (usually the render_hash column) if unknown."""
+        r = self.render_hashes.get(int(message_id), default=MISSING)
+        if r is not MISSING:
+            return r
+        return default
+
+    async def set_render_hash(
+        self, message_id: int, render_hash: Optional[str]
+    ) -> None:
+        """Stores a fingerprint of the message's current content, so
+        that edits that wouldn't change anything can be skipped."""
+        if self.render_hashes.get(message_id, default=MISSING) == render_hash:
+            return
+        self.render_hashes[message_id] = render_hash
+        self.unsaved_hashes.pop(message_id, None)
+        await self.db.execute(SET_RENDER_HASH, render_hash, message_id)
+
+    def edited_to(self, message_id: int, render_hash: str) -> None:
+        """Records what an edit changed the message to. It is only
+        saved along with the next set_points, instead of costing an
+        update of its own."""
+        self.render_hashes[message_id] = render_hash
+        self.unsaved_hashes[message_id] = render_hash
@@ -2,76 +2,87 @@ from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
 import asyncpg
 import buildpg
-import cachetools
 
 from app import commands, errors
+from app.classes.async_cache import AsyncCache
+from app.classes.cache_registry import CountedTTLCache, caches
+from app.classes.starboard_rules import GuildRules
 from app.cogs.premium.premium_funcs import can_increase, limit_for
 from app.constants import MISSING
+from app.database.statements import statements
 from app.i18n import t_
 
 if TYPE_CHECKING:
     from app.database.database import Database
 
+GET_STARBOARD = statements.register(
+    "starboards.get",
+    """SELECT * FROM starboards
+    WHERE id=$1""",
+)
+
+GET_STARBOARDS = statements.register(
+    "starboards.get_many",
+    """SELECT * FROM starboards
+    WHERE guild_id=$1""",
+)
+
 
 class Starboards:
     def __init__(self, db: "Database") -> None:
         self.db = db
-        self.cache = cachetools.TTLCache(500, 30)
-        self.many_cache = cachetools.TTLCache(500, 30)
-        self.emoji_cache = cachetools.TTLCache(500, 30)
+        self.cache = caches.register("starboards", AsyncCache(500, 30))
+        self.many_cache = caches.register(
+            "starboards.many", AsyncCache(500, 30)
+        )
+        # compiled rules, kept until invalidated by edited() (the ttl
+        # is only in case something edits starboards without it)
+        self.rules_cache = caches.register(
+            "starboards.rules", CountedTTLCache(5_000, 600)
+        )
+        # guild_id -> the load that's allowed to fill rules_cache
+        self._loading: Dict[int, object] = {}
 
     def edited(self, starboard_id: int, guild_id: Optional[int] = None):
-        if starboard_id in self.cache:
-            del self.cache[starboard_id]
+        self.cache.pop(starboard_id)
         if guild_id:
-            if guild_id in self.emoji_cache:
-                del self.emoji_cache[guild_id]
-            if guild_id in self.many_cache:
-                del self.many_cache[guild_id]
-
-    async def star_emojis(self, guild_id: int) -> List[str]:
-        r = self.emoji_cache.get(guild_id, default=MISSING)
+            self.edited_guild(guild_id)
+
+    def edited_guild(self, guild_id: int):
+        """Forgets the guild's starboards as a whole, e.g. after they
+        were all deleted."""
+        if guild_id in self.rules_cache:
+            del self.rules_cache[guild_id]
+        # a load that started before this edit may have old data
+        self._loading.pop(guild_id, None)
+        self.many_cache.pop(guild_id)
+
+    async def get_rules(self, guild_id: int) -> GuildRules:
+        r = self.rules_cache.get(guild_id, default=MISSING)
         if r is not MISSING:
             return r
 
-        _emojis = await self.db.execute(
-            """SELECT star_emojis FROM starboards
-            WHERE guild_id=$1""",
-            guild_id,
-        )
-        if _emojis:
-            emojis = [
-                emoji for record in _emojis for emoji in record["star_emojis"]
-            ]
-        else:
-            emojis = []
+        token = self._loading[guild_id] = object()
+        rules = GuildRules(await self.get_many(guild_id))
+        if self._loading.get(guild_id) is token:
+            del self._loading[guild_id]
+            self.rules_cache[guild_id] = rules
+        return rules
 
-        self.emoji_cache[guild_id] = emojis
-        return emojis
+    async def star_emojis(self, guild_id: int) -> List[str]:
+        return list((await self.get_rules(guild_id)).emojis)
 
     async def get(self, starboard_id: int) -> Optional[dict]:
-        r = self.cache.get(starboard_id, default=MISSING)
-        if r is not MISSING:
-            return r
-        sql_starboard = await self.db.fetchrow(
-            """SELECT * FROM starboards
-            WHERE id=$1""",
+        return await self.cache.get(
             starboard_id,
+            lambda: self.db.fetchrow(GET_STARBOARD, starboard_id),
         )
-        self.cache[starboard_id] = sql_starboard
-        return sql_starboard
 
     async def get_many(self, guild_id: int) -> List[Dict[Any, Any]]:
-        r = self.many_cache.get(guild_id, default=MISSING)
-        if r is not MISSING:
-            return r
-        sql_starboards = await self.db.fetch(
-            """SELECT * FROM starboards
-            WHERE guild_id=$1""",
+        return await self.many_cache.get(
             guild_id,
+            lambda: self.db.fetch(GET_STARBOARDS, guild_id),
         )
-        self.many_cache[guild_id] = sql_starboards
-        return sql_starboards
 
     async def create(
         self, channel_id: int, guild_id: int, check_first: bool = True
@@ -1,14 +1,31 @@
 from typing import TYPE_CHECKING, Optional
 
-import asyncpg
+from app.classes.cache_registry import CountedLRUCache, caches
+from app.database.statements import statements
 
 if TYPE_CHECKING:
     from app.database.database import Database
 
+GET_USER = statements.register(
+    "users.get",
+    """SELECT * FROM users
+    WHERE id=$1""",
+)
+
+CREATE_USER = statements.register(
+    "users.create",
+    """INSERT INTO users (id, is_bot)
+    VALUES ($1, $2)
+    ON CONFLICT DO NOTHING
+    RETURNING id""",
+)
+
 
 class Users:
     def __init__(self, db: "Database") -> None:
         self.db = db
+        # ids of users that are known to exist
+        self.known = caches.register("users.known", CountedLRUCache(50_000))
 
     async def set_patron_status(
         self,
@@ -53,27 +70,14 @@ class Users:
         )
 
     async def get(self, user_id: int) -> Optional[dict]:
-        return await self.db.fetchrow(
-            """SELECT * FROM users
-            WHERE id=$1""",
-            user_id,
-        )
-
-    async def create(
-        self, user_id: int, is_bot: bool, check_first: bool = True
-    ) -> bool:
-        if check_first:
-            exists = await self.get(user_id) is not None
-            if exists:
-                return True
+        return await self.db.fetchrow(GET_USER, user_id)
 
-        try:
-            await self.db.execute(
-                """INSERT INTO users (id, is_bot)
-                VALUES ($1, $2)""",
-                user_id,
-                is_bot,
-            )
-        except asyncpg.exceptions.UniqueViolationError:
+    async def create(self, user_id: int, is_bot: bool) -> bool:
+        """Returns True if the user already existed."""
+        if self.known.get(user_id):
             return True
-        return False
+
+        created = await self.db.fetchval(CREATE_USER, user_id, is_bot)
+        if not self.db.in_transaction():
+            self.known[user_id] = True
+        return created is None
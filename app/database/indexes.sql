@@ -1,6 +1,9 @@
 CREATE UNIQUE INDEX IF NOT EXISTS
     members__user_id__guild_id ON members (user_id, guild_id);
 
+CREATE INDEX IF NOT EXISTS
+    members__guild_id__xp ON members (guild_id, xp DESC);
+
 CREATE INDEX IF NOT EXISTS
     starboards__guild_id ON starboards USING HASH (guild_id);
 
@@ -29,4 +32,12 @@ CREATE INDEX IF NOT EXISTS
 
 CREATE INDEX IF NOT EXISTS
     members_posroles__guild_id ON members_posroles
-    USING HASH (guild_id);
\ No newline at end of file
+    USING HASH (guild_id);
+
+CREATE INDEX IF NOT EXISTS
+    starboard_messages__starboard_id__points__id ON starboard_messages
+    (starboard_id, points DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS
+    starboard_messages__starboard_id__id ON starboard_messages
+    (starboard_id, id);
@@ -1,2 +1,3 @@
 ALTER TABLE starboards ADD COLUMN IF NOT EXISTS locked BOOL NOT NULL DEFAULT False;
-ALTER TABLE aschannels ADD COLUMN IF NOT EXISTS max_chars SMALLINT DEFAULT NULL;
\ No newline at end of file
+ALTER TABLE aschannels ADD COLUMN IF NOT EXISTS max_chars SMALLINT DEFAULT NULL;
+ALTER TABLE starboard_messages ADD COLUMN IF NOT EXISTS render_hash TEXT DEFAULT NULL;
\ No newline at end of file
@@ -0,0 +1,53 @@
+from typing import Dict
+
+import asyncpg
+
+
+class StatementRegistry:
+    """The hottest queries, by name.
+
+    Every new pool connection prepares all of them before it is first
+    used (as long as _prepare() works with the installed asyncpg), so
+    they are already in asyncpg's statement cache (which is
+    keyed by the query string) the first time they run on it. Callers
+    just pass the exact string register() returned to Database.fetch*.
+
+    Statements are registered when the database_functions modules are
+    imported, which is always before the pool is created."""
+
+    def __init__(self) -> None:
+        self.statements: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def register(self, name: str, sql: str) -> str:
+        if self.statements.setdefault(name, sql) != sql:
+            raise ValueError(f"Statement {name} is already registered.")
+        return sql
+
+    async def prepare_all(self, con: asyncpg.Connection) -> None:
+        for name, sql in self.statements.items():
+            if not await _prepare(con, name, sql):
+                # they'll just be prepared when they are first used
+                return
+
+
+async def _prepare(con: asyncpg.Connection, name: str, sql: str) -> bool:
+    """Prepares sql the same way con.fetch() does on a cache miss, so
+    that it ends up in the connection's statement cache (prepare()
+    skips the cache, and its statements die with each pool release).
+
+    That's a private asyncpg method, so this returns False instead of
+    failing if it isn't there or takes different arguments."""
+    get_statement = getattr(con, "_get_statement", None)
+    if get_statement is None:
+        return False
+    try:
+        await get_statement(sql, None, named=name)
+    except TypeError:
+        return False
+    return True
+
+
+statements = StatementRegistry()
@@ -219,6 +219,7 @@ CREATE TABLE IF NOT EXISTS starboard_messages (
     starboard_id NUMERIC NOT NULL,
 
     points SMALLINT NOT NULL DEFAULT 0,
+    render_hash TEXT DEFAULT NULL,
 
     FOREIGN KEY (orig_id) REFERENCES messages (id)
         ON DELETE CASCADE,
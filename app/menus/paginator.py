@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
 
 import discord
 from discord.ext import menus
@@ -15,22 +15,24 @@ class Paginator(Menu):
         embed_pages: Optional[List[discord.Embed]] = None,
         text_pages: Optional[List[str]] = None,
         delete_after: bool = False,
+        get_page: Optional[Callable[[int], Awaitable[discord.Embed]]] = None,
+        page_count: Optional[int] = None,
     ) -> None:
+        """Instead of embed_pages, get_page can build each of page_count
+        embeds when it is shown."""
         super().__init__(delete_after=delete_after)
         self.embeds = embed_pages
         self.text = text_pages
+        self.get_page = get_page
         self.current_page = 0
-        self.length = len(embed_pages) if embed_pages else len(text_pages)
+        if get_page:
+            self.length = page_count
+        else:
+            self.length = len(embed_pages) if embed_pages else len(text_pages)
 
         if self.embeds and self.length != 1:
             for x, e in enumerate(self.embeds):
-                to_add = f"({x+1}/{self.length})"
-                footer = (
-                    e.footer.text + "\n" + to_add
-                    if isinstance(e.footer.text, str)
-                    else to_add
-                )
-                e.set_footer(text=footer, icon_url=e.footer.icon_url)
+                self._add_page_number(e, x)
         if self.length == 1:
             self.remove_button(self.skip_to_first.__menu_button__)
             self.remove_button(self.skip_to_last.__menu_button__)
@@ -39,6 +41,23 @@ class Paginator(Menu):
             if not delete_after:
                 self.remove_button(self.stop_menu.__menu_button__)
 
+    def _add_page_number(self, embed: discord.Embed, page: int) -> None:
+        to_add = f"({page+1}/{self.length})"
+        footer = (
+            embed.footer.text + "\n" + to_add
+            if isinstance(embed.footer.text, str)
+            else to_add
+        )
+        embed.set_footer(text=footer, icon_url=embed.footer.icon_url)
+
+    async def _current_embed(self) -> Optional[discord.Embed]:
+        if self.get_page:
+            embed = await self.get_page(self.current_page)
+            if self.length != 1:
+                self._add_page_number(embed, self.current_page)
+            return embed
+        return self.embeds[self.current_page] if self.embeds else None
+
     async def start(self, ctx, *, channel=None, wait=False):
         if self.length == 1 and not self.delete_message_after:
             return await self.send_initial_message(ctx, channel or ctx.channel)
@@ -49,7 +68,7 @@ class Paginator(Menu):
     ) -> discord.Message:
         return await ctx.send(
             self.text[self.current_page] if self.text else None,
-            embed=self.embeds[self.current_page] if self.embeds else None,
+            embed=await self._current_embed(),
         )
 
     async def edit_page(self, increment: int) -> None:
@@ -60,7 +79,7 @@ class Paginator(Menu):
         elif self.current_page > self.length - 1:
             self.current_page = 0
 
-        embed = self.embeds[self.current_page] if self.embeds else None
+        embed = await self._current_embed()
         text = self.text[self.current_page] if self.text else None
 
         try: